@@ -1,125 +1,168 @@
-from io import BytesIO, StringIO
+from datetime import datetime, timezone
+from io import BytesIO
+import logging
 import os
 
-import pandas as pd
-from flask import Flask, make_response, render_template, request, jsonify
-import spacy
+from flask import Flask, Response, make_response, render_template, request, jsonify, send_from_directory, stream_with_context, url_for
+import json
 import re
-from send import execute_query
-from pln import corrigir_tabela_de_texto
-from utils import clean_data, extract_portaria_info, extract_tables_from_xml, standardize_dataframe
-from llm import format_response, generate_query
+import threading
+from busca import index_available, search
+from cache import SingleFlightCache, make_key
+from cliente_llm import get_llm_cache
+from exportacao import WorkbookWriter, iter_csv, iter_json, iter_ndjson, project
+from extracao import StageTimer, extraction_key, run_extraction
+from jobs import DONE, JobManager
+from send import get_data_version, get_engine, query_cache
 from llm import llm_local
+from metricas import registry
+from roteador import responder, responder_stream
+from utils import get_nlp, header_cache_stats
 
 
+logger = logging.getLogger(__name__)
+
 app = Flask(__name__)
+job_manager = JobManager()
+extraction_cache = SingleFlightCache(max_entries=4)
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
 
+def _extracao_em_cache():
+    """
+    Resultado da extração para a versão atual dos dados. Requisições
+    simultâneas compartilham uma única execução do pipeline.
+    """
+    key = extraction_key(get_data_version())
+    return extraction_cache.get_or_compute(key, lambda: run_extraction(llm=llm_local))
+
+
+def _render_cached(entry, variant, render):
+    """Renderiza (uma vez por entrada do cache) o corpo de uma variante."""
+    renders = entry.value.setdefault("renders", {})
+    if variant not in renders:
+        renders[variant] = render(entry.value["data"])
+    return renders[variant]
+
+
+def _conditional(response, entry, variant, origem):
+    """Adiciona ETag/Last-Modified e responde 304 quando o cliente já tem a versão."""
+    response.set_etag(make_key(entry.key, variant))
+    response.last_modified = datetime.fromtimestamp(entry.created_at, timezone.utc)
+    response.headers['X-Cache'] = origem
+    return response.make_conditional(request)
+
+
+def _paginacao():
+    """Lê offset, limit e fields (projeção de colunas) da query string."""
+    offset = max(0, request.args.get("offset", 0, type=int))
+    limit = request.args.get("limit", None, type=int)
+    if limit is not None:
+        limit = max(0, limit)
+    fields = [field.strip() for field in request.args.get("fields", "").split(",") if field.strip()] or None
+    return offset, limit, fields
+
+
 @app.route('/extrair-portarias', methods=['GET'])
 def extrair_portarias():
     try:
-        print("Iniciando a função '/extrair-portarias'...")
-
-        query = """
-        SELECT id, texto, pubName, pubDate, artType, artCategory, Ementa
-        FROM dous
-        WHERE 
-            artType = 'Portaria' AND
-            artCategory LIKE 'Ministério da Saúde%' AND
-            (
-                texto LIKE '%incremento temporário%' OR
-                texto LIKE '%rateio dos recursos de transferência%' OR
-                texto LIKE '%emendas parlamentares%' OR
-                texto LIKE '%aplicação de emenda%' OR
-                texto LIKE '%atenção especializada à saúde%' OR
-                texto LIKE '%relatório anual de gestão RAG%' OR
-                texto LIKE '%Bloco de Manutenção das Ações e Serviços Públicos de Saúde%'
-            )
-        """
-        print("Executando consulta SQL...")
-        portarias = execute_query(query)
-
-        print(f"Portarias retornadas: {len(portarias) if portarias else 0}")
-
-        with open('portarias.txt', 'w', encoding='utf-8') as f:
-            for portaria in portarias:
-                f.write(f"{portaria}\n")
-        print("Arquivo 'portarias.txt' criado com sucesso.")
-
-        if not portarias:
-            return jsonify({"message": "Nenhuma portaria encontrada com os critérios especificados"}), 404
-
-        all_data = []
-        csv_filename = 'portarias.csv'
-        excel_filename = 'portarias.xlsx'
-
-        for idx, portaria in enumerate(portarias):
-            try:
-                print(f"\n🔍 Processando portaria {idx + 1} de {len(portarias)}...")
-                texto_portaria = portaria[1]
-                portaria_info = extract_portaria_info(texto_portaria)
-
-                print(f"Portaria Nº {portaria_info.get('numero_portaria')} - Data: {portaria_info.get('data_portaria')}")
-
-                tables = extract_tables_from_xml(texto_portaria)
-                print(f"Tabelas extraídas: {len(tables)}")
-
-                for table_df in tables:
-                    try:
-                        # Etapa 1: padronizar
-                        standardized_df = standardize_dataframe(table_df, portaria_info)
-
-                        # Etapa 2: corrigir com LLM (se disponível)
-                        if llm_local:
-                            standardized_df = corrigir_tabela_de_texto(texto_portaria, llm_local)
-
-                        # Adicionar metadados
-                        standardized_df['numero da portaria'] = portaria_info.get('numero_portaria', '')
-                        standardized_df['data'] = portaria_info.get('data_portaria', '')
-
-                        # Limpeza final
-                        standardized_df = clean_data(standardized_df)
-
-                        # Salvar CSV e Excel
-                        standardized_df.to_csv(csv_filename, mode='a', index=False, encoding='utf-8-sig', sep=';', header=not os.path.exists(csv_filename))
-                        standardized_df.to_excel(excel_filename, index=False, header=not os.path.exists(excel_filename))
-
-                        all_data.append(standardized_df)
-
-                    except Exception as e:
-                        print(f"⚠️ Erro ao processar tabela: {str(e)}")
-                        continue
-
-            except Exception as e:
-                print(f"⚠️ Erro ao processar portaria {idx + 1}: {str(e)}")
-                continue
-
-        if not all_data:
-            return jsonify({"message": "Nenhuma tabela válida encontrada"}), 404
-
-        final_df = pd.concat(all_data, ignore_index=True)
-        final_df = clean_data(final_df)
-
-        final_df.to_csv('tabelas_unificadas.csv', index=False, encoding='utf-8-sig', sep=';')
-        final_df.to_excel('tabelas_unificadas.xlsx', index=False)
-
-        print("\n✅ Tabela unificada salva com sucesso.")
-
-        return jsonify({
-            "data": final_df.to_dict(orient='records'),
-            "count": len(final_df),
-            "status": "success"
-        })
+        entry, origem = _extracao_em_cache()
+        final_df = entry.value["data"]
+        if final_df is None:
+            return jsonify({"message": entry.value["message"]}), 404
+
+        offset, limit, fields = _paginacao()
+        try:
+            page = project(final_df, fields, offset, limit)
+        except KeyError as e:
+            return jsonify({"error": e.args[0]}), 400
+
+        # format=ndjson: um registro por linha; padrão: JSON paginado
+        formato = request.args.get("format", "json")
+        if formato == "ndjson":
+            response = Response(iter_ndjson(page), mimetype='application/x-ndjson')
+        else:
+            response = Response(iter_json(page, extra={
+                "total": len(final_df),
+                "offset": offset,
+                "limit": limit,
+                "status": "success",
+            }), mimetype='application/json')
+        return _conditional(response, entry, [formato, offset, limit, fields], origem)
 
     except Exception as e:
-        print(f"❌ Erro no endpoint '/extrair-portarias': {str(e)}")
+        logger.exception("Erro no endpoint '/extrair-portarias'")
         return jsonify({"error": str(e)}), 500
 
 
+def _extraction_job(job):
+    timer = StageTimer()
+
+    def _progresso(processadas, total, tabelas, erros):
+        # Cópia dos tempos feita na thread do job, que é quem altera o dicionário
+        job.update_progress(processadas, total, tabelas, erros, timings=timer.timings)
+
+    return run_extraction(
+        output_dir=job.output_dir,
+        on_progress=_progresso,
+        cancel_event=job.cancel_event,
+        timer=timer,
+        llm=llm_local,
+    )
+
+
+@app.route('/extrair-portarias/jobs', methods=['POST'])
+def criar_job_extracao():
+    job = job_manager.submit("extrair-portarias", _extraction_job)
+    return jsonify({**job.to_dict(), "status_url": url_for('status_job', job_id=job.id)}), 202
+
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def status_job(job_id):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/cancelar', methods=['POST'])
+def cancelar_job(job_id):
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route('/jobs/<job_id>/arquivos/<nome>', methods=['GET'])
+def baixar_arquivo_job(job_id, nome):
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job não encontrado"}), 404
+    if job.status != DONE or nome not in job.artifacts:
+        return jsonify({"error": "Arquivo indisponível", "status": job.status}), 404
+    return send_from_directory(os.path.abspath(job.output_dir), nome, as_attachment=True)
+
+
+@app.route('/buscar', methods=['GET'])
+def buscar():
+    termo = request.args.get("q", "").strip()
+    if not termo:
+        return jsonify({"error": "Informe o parâmetro 'q'."}), 400
+    if not index_available(get_engine()):
+        return jsonify({"error": "Índice de texto completo ausente ou desatualizado. Rode 'python ingest.py --reindexar'."}), 503
+
+    limite = max(1, min(request.args.get("limite", 20, type=int), 200))
+    resultados = search(termo, limit=limite)
+    return jsonify({"data": resultados, "count": len(resultados), "status": "success"})
+
+
+def _eventos_sse(pergunta):
+    for tipo, dados in responder_stream(pergunta):
+        yield f"event: {tipo}\ndata: {json.dumps(dados, ensure_ascii=False)}\n\n"
+
 
 @app.route('/ask', methods=['POST'])
 def ask_question():
@@ -128,58 +171,96 @@ def ask_question():
     if not user_question:
         return jsonify({"response": "Por favor, faça uma pergunta válida."})
 
-    # A LLM gera a query correta
-    query = generate_query(user_question)
-    print(f"Query gerada pela LLM: {query}")
+    # Com "stream": true (ou Accept: text/event-stream) a resposta sai em
+    # Server-Sent Events, token a token
+    if request.json.get("stream") or request.accept_mimetypes.best == 'text/event-stream':
+        return Response(stream_with_context(_eventos_sse(user_question)), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+    # Regras determinísticas primeiro; a LLM só quando elas não respondem
+    resultado = responder(user_question)
+    response = jsonify(resultado)
+    response.headers['X-Camada'] = resultado["camada"]
+    if resultado.get("cache"):
+        response.headers['X-Cache-Consulta'] = resultado["cache"]
+    return response
 
-    if not query:
-        return jsonify({"response": "Não foi possível entender a pergunta."})
 
-    result = execute_query(query)
-    print(f"Resultado da query: {result}")
-    
-    if not result:
-        return jsonify({"response": "Nenhum resultado encontrado."})
+def _to_excel(df):
+    output = BytesIO()
+    with WorkbookWriter(output, sheet_name='Portarias') as writer:
+        writer.append(df)
+    return output.getvalue()
 
-    # Remove duplicatas
-    result = list(set(result))
 
-    # Formata a resposta com a LLM
-    formatted_response = format_response(user_question, result)
+def _exportar(variant, filename, content_type, render=None, stream=None):
+    try:
+        entry, origem = _extracao_em_cache()
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    if entry.value["data"] is None:
+        return jsonify({"message": entry.value["message"]}), 404
+
+    if stream is not None:
+        offset, limit, fields = _paginacao()
+        try:
+            page = project(entry.value["data"], fields, offset, limit)
+        except KeyError as e:
+            return jsonify({"error": e.args[0]}), 400
+        response = Response(stream(page), content_type=content_type)
+        variant = [variant, offset, limit, fields]
+    else:
+        response = make_response(_render_cached(entry, variant, render))
+        response.headers['Content-type'] = content_type
+    response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+    return _conditional(response, entry, variant, origem)
+
 
-    return jsonify({"response": formatted_response})
 @app.route('/exportar-portarias-csv', methods=['GET'])
 def exportar_csv():
-    data = extrair_portarias().get_json()
-    if 'error' in data:
-        return jsonify(data), 500
-    
-    df = pd.DataFrame(data['data'])
-    output = StringIO()
-    df.to_csv(output, index=False, encoding='utf-8-sig', sep=';')
-    output.seek(0)
-    
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = 'attachment; filename=portarias.csv'
-    response.headers['Content-type'] = 'text/csv; charset=utf-8-sig'
-    return response
+    return _exportar("csv", 'portarias.csv', 'text/csv; charset=utf-8-sig', stream=iter_csv)
 
 @app.route('/exportar-portarias-excel', methods=['GET'])
 def exportar_excel():
-    data = extrair_portarias().get_json()
-    if 'error' in data:
-        return jsonify(data), 500
-    
-    df = pd.DataFrame(data['data'])
-    output = BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        df.to_excel(writer, index=False, sheet_name='Portarias')
-    
-    output.seek(0)
-    
-    response = make_response(output.getvalue())
-    response.headers['Content-Disposition'] = 'attachment; filename=portarias.xlsx'
-    response.headers['Content-type'] = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-    return response
+    return _exportar("xlsx", 'portarias.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', render=_to_excel)
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas no formato de exposição do Prometheus."""
+    for nome, valor in extraction_cache.stats().items():
+        registry.set_gauge("dous_cache_extracao", valor, tipo=nome)
+    for nome, valor in header_cache_stats().items():
+        registry.set_gauge("dous_cache_cabecalhos", valor, tipo=nome)
+    if query_cache is not None:
+        for nome, valor in query_cache.stats().items():
+            registry.set_gauge("dous_cache_consultas", valor, tipo=nome)
+    llm_cache = get_llm_cache()
+    if llm_cache is not None:
+        for nome, valor in llm_cache.stats().items():
+            registry.set_gauge("dous_cache_llm", valor, tipo=nome)
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4')
+
+
+def warm_up():
+    """
+    Aquecimento opcional: carrega o modelo spaCy e abre uma conexão do pool
+    antes da primeira requisição, em vez de no primeiro uso.
+    """
+    try:
+        get_nlp()
+        with get_engine().connect():
+            pass
+        logger.info("Aquecimento concluído")
+    except Exception as e:
+        logger.warning("Falha no aquecimento: %s", e)
+
+
 if __name__ == '__main__':
+    logging.basicConfig(
+        level=os.environ.get("DOUS_LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    if os.environ.get("DOUS_WARMUP", "").lower() in ("1", "true", "sim"):
+        threading.Thread(target=warm_up, name="warm-up", daemon=True).start()
     app.run(debug=True)
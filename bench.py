@@ -0,0 +1,507 @@
+"""
+Benchmarks locais (sem SQL Server nem LM Studio).
+
+Uso:
+    python bench.py loader --rows 200000
+    python bench.py tabelas --rows 5000
+    python bench.py validadores --rows 1000000
+    python bench.py llm --prompts 64 --latency 0.2
+    python bench.py importacao --budget 3
+    python bench.py consulta --portarias 500 2000 8000
+    python bench.py contexto --rows 10 100 10000
+    python bench.py ttft --tokens 200 --latency 0.3 --intervalo 0.02
+    python bench.py ingestao --arquivos 20 --artigos 200
+"""
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+from sqlalchemy import create_engine
+
+from loader import DOUS_COLUMNS, LOADERS, engine_options, load_dataframe
+
+
+def _synthetic_dous(rows):
+    """DataFrame com o formato da tabela dous e textos de tamanho realista."""
+    data = {col: [""] * rows for col in DOUS_COLUMNS}
+    df = pd.DataFrame(data)
+    for col in ["id", "idOficio", "artSize", "numberPage", "idMateria"]:
+        df[col] = range(rows)
+    for col in ["artNotes", "highlightType", "highlightPriority", "highlight", "highlightimage", "highlightimagename", "Midias"]:
+        df[col] = 0.0
+    df["artType"] = "Portaria"
+    df["artCategory"] = "Ministério da Saúde/Gabinete do Ministro"
+    df["Identifica"] = "PORTARIA GM/MS Nº 1.234, DE 30 DE ABRIL DE 2024"
+    df["Texto"] = "<p>" + "texto da portaria " * 50 + "</p>"
+    return df
+
+
+def bench_loader(args):
+    df = _synthetic_dous(args.rows)
+    for method in args.methods:
+        with tempfile.TemporaryDirectory() as tmp:
+            url = args.db_url or f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+            engine = create_engine(url, **engine_options(url))
+            started = time.perf_counter()
+            with engine.begin() as conn:
+                load_dataframe(conn, df, method=method, chunk_size=args.chunk_size)
+            elapsed = time.perf_counter() - started
+            engine.dispose()
+        print(f"{method:12s} {args.rows} linhas em {elapsed:.2f}s ({args.rows / elapsed:,.0f} linhas/s)")
+
+
+def _synthetic_portaria(rows, tables=2):
+    """Texto HTML no formato das portarias do MS, com tabelas de `rows` linhas."""
+    parts = ['<p class="identifica">PORTARIA GM/MS Nº 3.456, DE 30 DE ABRIL DE 2024</p>',
+             '<p class="ementa">Habilita o incremento temporário&nbsp;ao custeio.</p>']
+    for t in range(tables):
+        parts.append('<table class="dou-table"><tbody>')
+        parts.append('<tr><td colspan="6"><p>ANEXO</p></td></tr>')
+        parts.append('<tr><td><p><b>UF</b></p></td><td>MUNICÍPIO</td><td>IBGE</td>'
+                     '<th>CNES</th><td><p>ESTABELECIMENTO</p></td><td>VALOR<br/> (R$)</td></tr>')
+        for i in range(rows):
+            cells = [f"<td><p> {'AL' if i % 2 else 'SP'} </p></td>", f"<td>Município {i}</td>",
+                     f"<td>{270000 + i}</td>", f"<td><span>{2000000 + i}</span></td>",
+                     f"<td><p>Hospital</p><p>&amp; Maternidade {t}</p></td>", f"<td>{i},00</td>"]
+            # Linhas com células faltando ou sobrando
+            if i % 97 == 0:
+                cells = cells[:4]
+            elif i % 89 == 0:
+                cells.append("<td>extra</td>")
+            parts.append("<tr>" + "".join(cells) + "</tr>")
+        parts.append("</tbody></table>")
+    return "".join(parts)
+
+
+def bench_tabelas(args):
+    import io
+
+    from utils import extract_tables_from_xml, extract_tables_from_xml_bs4
+
+    texto = _synthetic_portaria(args.rows, args.tables)
+    timings = {}
+    outputs = {}
+    for name, fn in (("bs4", extract_tables_from_xml_bs4), ("lxml", extract_tables_from_xml)):
+        started = time.perf_counter()
+        for _ in range(args.repeat):
+            # A versão original imprime cada linha; a saída é descartada
+            with contextlib.redirect_stdout(io.StringIO()):
+                outputs[name] = fn(texto)
+        timings[name] = (time.perf_counter() - started) / args.repeat
+
+    assert len(outputs["bs4"]) == len(outputs["lxml"]), "número de tabelas diferente"
+    for expected, got in zip(outputs["bs4"], outputs["lxml"]):
+        pd.testing.assert_frame_equal(expected, got)
+    print(f"Paridade OK: {len(outputs['lxml'])} tabelas x {args.rows} linhas")
+    for name, seconds in timings.items():
+        print(f"{name:5s} {seconds * 1000:8.1f} ms por portaria")
+    print(f"Aceleração: {timings['bs4'] / timings['lxml']:.1f}x")
+
+
+def _cnpj_digits(base):
+    """Completa 12 dígitos com os dois verificadores do CNPJ."""
+    digits = [int(c) for c in base]
+    for weights in ([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2], [6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]):
+        remainder = sum(d * w for d, w in zip(digits, weights)) % 11
+        digits.append(0 if remainder < 2 else 11 - remainder)
+    return "".join(map(str, digits))
+
+
+def _synthetic_unificada(rows):
+    """Tabela unificada com ~10% de valores inválidos em cada coluna validada."""
+    base = pd.DataFrame({
+        "UF": ["SP", "al", "XXX", "MG", "RJ", "BA", "PE", "CE", "PR", "RS"],
+        "município": ["São Paulo", "Maceió", "123", "Belo Horizonte", "Rio", "Salvador", "Recife", "Fortaleza", "Curitiba", ""],
+        "código IBGE": ["355030", "270430", "31062", "310620", "330455", "292740", "261160", "230440", "410690", "431490"],
+        "nome do fundo": ["FUNDO MUNICIPAL DE SAUDE"] * 9 + ["999"],
+        "CNPJ": [_cnpj_digits(f"{i:08d}0001") for i in range(9)] + ["11222333000182"],
+        "CNES": ["2077485", "2006197", "123", "0027014", "2269783", "0003808", "0000434", "2561492", "0015563", "2237253"],
+        "valor": ["R$ 1.500,00", "200.000,00", "x", "10,50", "3.000", "1,00", "", "7.777,77", "0,01", "100"],
+        "data": ["30/04/2024", "01/01/2024", "31/02/2024", "15/07/2023", "02/10/2024", "11/11/2022", "x", "05/05/2024", "06/06/2024", "07/07/2024"],
+    })
+    return pd.concat([base] * (rows // len(base) + 1), ignore_index=True).iloc[:rows]
+
+
+def _scalar_clean(df):
+    """Referência célula a célula (Series.apply), como era feito antes."""
+    from datetime import datetime
+
+    def date_ok(value):
+        try:
+            datetime.strptime(value, "%d/%m/%Y")
+            return True
+        except (TypeError, ValueError):
+            return False
+
+    def cnpj_ok(value):
+        return isinstance(value, str) and value.isdigit() and len(value) == 14 and _cnpj_digits(value[:12]) == value and len(set(value)) > 1
+
+    checks = {
+        "CNES": lambda v: isinstance(v, str) and v.isdigit() and len(v) == 7,
+        "data": date_ok,
+        "nome do fundo": lambda v: isinstance(v, str) and not v.isdigit() and bool(v.strip()),
+        "CNPJ": cnpj_ok,
+        "município": lambda v: isinstance(v, str) and not v.isdigit() and bool(v.strip()),
+        "código IBGE": lambda v: isinstance(v, str) and v.isdigit() and len(v) == 6,
+        "UF": lambda v: isinstance(v, str) and len(v) == 2 and v.isalpha(),
+    }
+    return {col: df[col].apply(check) for col, check in checks.items()}
+
+
+def bench_validadores(args):
+    from utils import VALIDATORS, clean_data
+
+    df = _synthetic_unificada(args.rows)
+
+    started = time.perf_counter()
+    expected = _scalar_clean(df)
+    scalar = time.perf_counter() - started
+
+    started = time.perf_counter()
+    masks = {col: validator(df[col]) for col, validator in VALIDATORS}
+    vectorized = time.perf_counter() - started
+
+    for col, mask in masks.items():
+        assert mask.equals(expected[col]), f"máscara divergente em {col}"
+    print(f"Paridade OK: {len(masks)} validadores x {args.rows} linhas")
+    print(f"célula a célula {scalar:8.2f}s")
+    print(f"vetorizado      {vectorized:8.2f}s ({scalar / vectorized:.0f}x)")
+
+    started = time.perf_counter()
+    clean_data(df.copy())
+    print(f"clean_data      {time.perf_counter() - started:8.2f}s")
+
+
+class _StubCompletions(BaseHTTPRequestHandler):
+    """Servidor de completions falso: responde após `latency` segundos."""
+
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.1
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.latency)
+        payload = json.dumps({"choices": [{"text": f"eco: {body['prompt'][:40]}"}]}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, *args):
+        pass
+
+
+class _StubStreaming(_StubCompletions):
+    """
+    Servidor falso com o modo stream da API: `latency` segundos até o
+    primeiro token e `interval` entre tokens, em Server-Sent Events
+    (chunked). Sem "stream" responde tudo de uma vez, no tempo total.
+    """
+
+    tokens = 100
+    interval = 0.02
+
+    def _chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        self.wfile.flush()
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        words = [f" tok{i}" for i in range(self.tokens)]
+        if not body.get("stream"):
+            time.sleep(self.latency + self.interval * (self.tokens - 1))
+            payload = json.dumps({"choices": [{"text": "".join(words)}]}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        time.sleep(self.latency)
+        for i, word in enumerate(words):
+            if i:
+                time.sleep(self.interval)
+            self._chunk(f"data: {json.dumps({'choices': [{'text': word}]})}\n\n".encode())
+        self._chunk(b"data: [DONE]\n\n")
+        self._chunk(b"")
+
+
+@contextlib.contextmanager
+def _stub_server(handler):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_port}/v1/completions"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def bench_llm(args):
+    from cliente_llm import LLMClient
+
+    handler = type("Stub", (_StubCompletions,), {"latency": args.latency})
+    prompts = [f"prompt {i}" for i in range(args.prompts)]
+    with _stub_server(handler) as url:
+        for concurrency in args.concurrency:
+            client = LLMClient(url=url, concurrency=concurrency, cache=None)
+            started = time.perf_counter()
+            texts = client.complete_many(prompts, "stub")
+            elapsed = time.perf_counter() - started
+            client.close()
+            assert texts == [f"eco: {prompt}" for prompt in prompts]
+            print(f"concorrência {concurrency:3d}: {len(prompts)} prompts em {elapsed:.2f}s ({len(prompts) / elapsed:.1f} prompts/s)")
+
+
+def bench_ttft(args):
+    """Tempo até o primeiro token (o que o usuário sente): complete() x stream()."""
+    from cliente_llm import LLMClient
+
+    handler = type("Stub", (_StubStreaming,), {"latency": args.latency, "interval": args.intervalo, "tokens": args.tokens})
+    with _stub_server(handler) as url:
+        client = LLMClient(url=url, cache=None)
+        for i in range(args.repeat):
+            started = time.perf_counter()
+            text = client.complete(f"prompt {i}", "stub")
+            bloqueante = time.perf_counter() - started
+
+            started = time.perf_counter()
+            first = None
+            parts = []
+            for part in client.stream(f"prompt {i}", "stub"):
+                if first is None:
+                    first = time.perf_counter() - started
+                parts.append(part)
+            total = time.perf_counter() - started
+            assert "".join(parts).strip() == text
+            print(f"bloqueante: 1º texto em {bloqueante * 1000:7.0f} ms | "
+                  f"stream: 1º token em {first * 1000:5.0f} ms, completo em {total * 1000:7.0f} ms ({len(parts)} pedaços)")
+        client.close()
+
+
+def bench_importacao(args):
+    """Tempo de importação do módulo (python -X importtime) contra um orçamento."""
+    command = [sys.executable, "-X", "importtime", "-c", f"import {args.module}"]
+    started = time.perf_counter()
+    proc = subprocess.run(command, capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    elapsed = time.perf_counter() - started
+    if proc.returncode:
+        print(proc.stderr[-2000:])
+        sys.exit(proc.returncode)
+
+    # Linhas "import time: self [us] | cumulative | pacote"; sem recuo = importação de topo
+    top = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if not name.startswith("  "):
+            top.append((int(cumulative), name.strip()))
+    for cumulative, name in sorted(top, reverse=True)[:args.top]:
+        print(f"{cumulative / 1e6:8.3f}s  {name}")
+    print(f"import {args.module}: {elapsed:.2f}s (orçamento {args.budget:.2f}s)")
+    if elapsed > args.budget:
+        print("❌ Acima do orçamento de inicialização")
+        sys.exit(1)
+    print("✅ Dentro do orçamento")
+
+
+def bench_consulta(args):
+    """Pico de memória ao percorrer as portarias: execute_query (lista) x stream_query."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # send lê a configuração do ambiente na importação
+        os.environ["DOUS_DB_URL"] = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        os.environ["DOUS_QUERY_CACHE_MB"] = "0"
+        import send
+
+        df = _synthetic_dous(max(args.portarias))
+        df["Texto"] = _synthetic_portaria(args.rows)
+        with send.get_engine().begin() as conn:
+            load_dataframe(conn, df)
+        print(f"texto de cada portaria: {len(df['Texto'][0]) / 1024:.0f} KiB")
+
+        query = "SELECT id, Texto FROM dous WHERE id < :n"
+        for n in args.portarias:
+            for name, run in (("execute_query", send.execute_query), ("stream_query", send.stream_query)):
+                tracemalloc.start()
+                started = time.perf_counter()
+                total = sum(len(row[1]) for row in run(query, {"n": n}))
+                elapsed = time.perf_counter() - started
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                print(f"{n:6d} portarias  {name:14s} {elapsed:6.2f}s  pico {peak / 2**20:8.1f} MiB  ({total / 2**20:.0f} MiB lidos)")
+        send.get_engine().dispose()
+
+
+def bench_contexto(args):
+    """Tamanho do contexto do format_response: repr das linhas x compactar_resultado."""
+    from contexto import _numero, compactar_resultado, estimar_tokens
+
+    # Valores no formato brasileiro
+    for texto, esperado in (("1.234,56", 1234.56), ("R$ 1.500", 1500.0), ("1.500", 1500.0),
+                            ("1.234.567", 1234567.0), ("1,5", 1.5), ("1.5", 1.5), ("abc", None)):
+        assert _numero(texto) == esperado, f"_numero({texto!r}) = {_numero(texto)!r}, esperado {esperado!r}"
+
+    df = _synthetic_dous(max(args.rows))
+    df["UF"] = ["SP", "AL", "BA", "MG"] * (len(df) // 4) + ["SP"] * (len(df) % 4)
+    df["valor"] = [f"{i},00" for i in range(len(df))]
+    colunas = list(df.columns)
+    todas = list(df.itertuples(index=False, name=None))
+    for n in args.rows:
+        linhas = todas[:n]
+        started = time.perf_counter()
+        contexto = compactar_resultado(colunas, linhas, max_tokens=args.tokens)
+        elapsed = time.perf_counter() - started
+        bruto = estimar_tokens(repr(linhas))
+        print(f"{n:7d} linhas: repr ~{bruto:10,d} tokens | compacto ~{estimar_tokens(contexto):5d} tokens em {elapsed * 1000:6.1f} ms")
+
+
+def _write_xml(path, articles):
+    """Grava um XML no formato do DOU com os artigos [(id, idMateria, texto)]."""
+    from xml.sax.saxutils import quoteattr, escape
+
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("<xml>\n")
+        for id_, materia, texto in articles:
+            f.write(
+                f'<article id="{id_}" idMateria="{materia}" name="Portaria {id_}" artType="Portaria" '
+                f'artCategory={quoteattr("Ministério da Saúde/Gabinete do Ministro")} pubDate="30/04/2024">'
+                f"<body><Identifica>PORTARIA GM/MS Nº {id_}</Identifica><Ementa></Ementa>"
+                f"<Texto>{escape(texto)}</Texto></body></article>\n"
+            )
+        f.write("</xml>\n")
+
+
+def bench_ingestao(args):
+    """Ingestão completa x incremental num SQLite temporário, conferindo as linhas."""
+    with tempfile.TemporaryDirectory() as tmp:
+        # busca lê o caminho do índice do ambiente na importação
+        os.environ["DOUS_FTS_PATH"] = os.path.join(tmp, "fts.db")
+        from busca import index_available, match_keys
+        from ingest import ingest_folder
+
+        def _table(engine):
+            with engine.connect() as conn:
+                return {(row[0], row[1]): row[2] for row in conn.exec_driver_sql("SELECT id, idMateria, Texto FROM dous")}
+
+        pasta = os.path.join(tmp, "xml")
+        os.makedirs(pasta)
+        files = {}
+        for n in range(args.arquivos):
+            base = n * args.artigos
+            files[n] = [(base + i, 1000 + (base + i) % 7, f"texto marca{base + i}x") for i in range(args.artigos)]
+        # Mesmos ids com outra idMateria, em outro arquivo: chaves cruzadas
+        files["cruzado"] = [(0, 2000, "texto cruzado"), (2, 1000, "texto cruzado 2")]
+        for name, articles in files.items():
+            _write_xml(os.path.join(pasta, f"{name}.xml"), articles)
+
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        started = time.perf_counter()
+        ingest_folder(engine, pasta, incremental=False, workers=1)
+        completa = time.perf_counter() - started
+        esperado = {(a[0], a[1]): a[2] for articles in files.values() for a in articles}
+        assert _table(engine) == esperado, "ingestão completa difere dos XMLs"
+
+        # Arquivo 0: um artigo alterado, um removido e um novo
+        alterado = files[0]
+        removido = alterado.pop(1)
+        alterado[0] = (alterado[0][0], alterado[0][1], "texto alterado")
+        alterado.append((10**9, 1, "texto novo"))
+        path = os.path.join(pasta, "0.xml")
+        _write_xml(path, alterado)
+        os.utime(path, (time.time() + 10, time.time() + 10))
+
+        started = time.perf_counter()
+        ingest_folder(engine, pasta, incremental=True, workers=1)
+        incremental = time.perf_counter() - started
+        esperado = {(a[0], a[1]): a[2] for articles in files.values() for a in articles}
+        tabela = _table(engine)
+        assert (removido[0], removido[1]) not in tabela, "linha removida do arquivo continua na tabela"
+        assert tabela == esperado, "ingestão incremental difere dos XMLs"
+        assert not match_keys([f"marca{removido[0]}x"]), "linha removida continua no índice"
+        assert index_available(engine), "índice não registrou a versão da ingestão incremental"
+
+        engine.dispose()
+    print(f"completa:    {completa:6.2f}s ({len(esperado)} linhas)")
+    print(f"incremental: {incremental:6.2f}s (1 arquivo alterado)")
+    print("✅ Tabela igual aos XMLs após a ingestão incremental")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="bench", required=True)
+
+    p = sub.add_parser("loader", help="Vazão dos carregadores da tabela dous")
+    p.add_argument("--rows", type=int, default=100000)
+    p.add_argument("--chunk-size", type=int, default=10000)
+    p.add_argument("--methods", nargs="+", default=list(LOADERS), choices=list(LOADERS))
+    p.add_argument("--db-url", help="Banco alvo (padrão: SQLite temporário)")
+    p.set_defaults(func=bench_loader)
+
+    p = sub.add_parser("tabelas", help="Paridade e velocidade do extrator de tabelas (lxml x BeautifulSoup)")
+    p.add_argument("--rows", type=int, default=5000)
+    p.add_argument("--tables", type=int, default=2)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_tabelas)
+
+    p = sub.add_parser("validadores", help="Validadores vetorizados de clean_data x Series.apply")
+    p.add_argument("--rows", type=int, default=1000000)
+    p.set_defaults(func=bench_validadores)
+
+    p = sub.add_parser("llm", help="Vazão do cliente LLM em lotes contra um servidor falso")
+    p.add_argument("--prompts", type=int, default=64)
+    p.add_argument("--latency", type=float, default=0.2, help="Latência simulada por chamada (s)")
+    p.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    p.set_defaults(func=bench_llm)
+
+    p = sub.add_parser("ttft", help="Tempo até o primeiro token: resposta inteira x streaming, contra um servidor falso")
+    p.add_argument("--tokens", type=int, default=200)
+    p.add_argument("--latency", type=float, default=0.3, help="Tempo até o primeiro token (s)")
+    p.add_argument("--intervalo", type=float, default=0.02, help="Intervalo entre tokens (s)")
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=bench_ttft)
+
+    p = sub.add_parser("importacao", help="Tempo de importação do app contra um orçamento")
+    p.add_argument("--module", default="app")
+    p.add_argument("--budget", type=float, default=3.0, help="Orçamento em segundos")
+    p.add_argument("--top", type=int, default=10)
+    p.set_defaults(func=bench_importacao)
+
+    p = sub.add_parser("consulta", help="Memória de execute_query x stream_query ao ler as portarias")
+    p.add_argument("--portarias", type=int, nargs="+", default=[500, 2000, 8000])
+    p.add_argument("--rows", type=int, default=50, help="Linhas de cada tabela da portaria sintética")
+    p.set_defaults(func=bench_consulta)
+
+    p = sub.add_parser("contexto", help="Tamanho do contexto do /ask com e sem compactação")
+    p.add_argument("--rows", type=int, nargs="+", default=[10, 100, 10000])
+    p.add_argument("--tokens", type=int, default=1500, help="Orçamento de tokens")
+    p.set_defaults(func=bench_contexto)
+
+    p = sub.add_parser("ingestao", help="Ingestão completa x incremental, conferindo a tabela contra os XMLs")
+    p.add_argument("--arquivos", type=int, default=20)
+    p.add_argument("--artigos", type=int, default=200, help="Artigos por arquivo")
+    p.set_defaults(func=bench_ingestao)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
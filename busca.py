@@ -0,0 +1,182 @@
+import html
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+
+from loader import read_data_version, read_index_version
+
+# Índice de texto completo (SQLite FTS5) mantido ao lado da tabela dous
+FTS_PATH = os.environ.get("DOUS_FTS_PATH", "./dous_fts.db")
+
+# Pesos do bm25 por coluna: Identifica, Ementa, texto
+BM25_WEIGHTS = (10.0, 5.0, 1.0)
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_SPACE_RE = re.compile(r"\s+")
+
+
+def html_to_text(value):
+    """Remove as tags HTML e normaliza os espaços, para indexação."""
+    if not value:
+        return ""
+    return _SPACE_RE.sub(" ", html.unescape(_TAG_RE.sub(" ", value))).strip()
+
+
+@contextmanager
+def _connect(path=None):
+    conn = sqlite3.connect(path or FTS_PATH)
+    try:
+        # O rowid do índice vem de dous_fts_chaves, uma linha por chave
+        # (id, idMateria); índices antigos (rowid = id) são descartados
+        if not conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'dous_fts_chaves'").fetchone():
+            conn.execute("DROP TABLE IF EXISTS dous_fts")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS dous_fts_chaves (
+                rowid INTEGER PRIMARY KEY,
+                id INTEGER NOT NULL,
+                idMateria INTEGER NOT NULL,
+                UNIQUE (id, idMateria)
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE IF NOT EXISTS dous_fts USING fts5(
+                Identifica, Ementa, texto,
+                idMateria UNINDEXED, artType UNINDEXED, artCategory UNINDEXED, pubDate UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2'
+            )
+            """
+        )
+        yield conn
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def index_available(engine, path=None):
+    """
+    Indica se o índice pode substituir a varredura no banco: o arquivo existe
+    e foi construído para a versão atual dos dados (dous_versao_indice igual
+    a dous_versao). Um índice de outra versão pode estar incompleto.
+    """
+    if not os.path.exists(path or FTS_PATH):
+        return False
+    with engine.connect() as conn:
+        indexed = read_index_version(conn)
+        return indexed > 0 and indexed == read_data_version(conn)
+
+
+def clear_index(path=None):
+    """Apaga todo o conteúdo do índice (usado na ingestão completa)."""
+    with _connect(path) as conn:
+        conn.execute("DELETE FROM dous_fts")
+        conn.execute("DELETE FROM dous_fts_chaves")
+
+
+def _rowids(conn, pairs):
+    # rowid de cada chave (id, idMateria), criando as que faltam
+    conn.executemany("INSERT OR IGNORE INTO dous_fts_chaves (id, idMateria) VALUES (?, ?)", pairs)
+    return [
+        conn.execute("SELECT rowid FROM dous_fts_chaves WHERE id = ? AND idMateria = ?", pair).fetchone()[0]
+        for pair in pairs
+    ]
+
+
+def index_dataframe(df, path=None):
+    """
+    Indexa (ou reindexa) as linhas de um lote da tabela dous. Cada chave
+    (id, idMateria) tem um rowid próprio, de modo que reindexar substitui a
+    entrada antiga sem misturar artigos com o mesmo id.
+    """
+    if df.empty:
+        return
+    df = df.drop_duplicates(subset=["id", "idMateria"], keep="last")
+    rows = [
+        (row.Identifica, row.Ementa, html_to_text(row.Texto), int(row.idMateria), row.artType, row.artCategory, row.pubDate)
+        for row in df[["Identifica", "Ementa", "Texto", "idMateria", "artType", "artCategory", "pubDate"]].itertuples(index=False)
+    ]
+    pairs = [(int(id_), int(materia)) for id_, materia in df[["id", "idMateria"]].itertuples(index=False, name=None)]
+    with _connect(path) as conn:
+        rowids = _rowids(conn, pairs)
+        conn.executemany("DELETE FROM dous_fts WHERE rowid = ?", [(rowid,) for rowid in rowids])
+        conn.executemany(
+            "INSERT INTO dous_fts (rowid, Identifica, Ementa, texto, idMateria, artType, artCategory, pubDate) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(rowid,) + row for rowid, row in zip(rowids, rows)],
+        )
+
+
+def remove_from_index(pairs, path=None):
+    """Remove do índice as entradas com as chaves (id, idMateria) dadas."""
+    pairs = [(int(id_), int(materia)) for id_, materia in pairs]
+    with _connect(path) as conn:
+        conn.executemany(
+            "DELETE FROM dous_fts WHERE rowid = (SELECT rowid FROM dous_fts_chaves WHERE id = ? AND idMateria = ?)",
+            pairs,
+        )
+        conn.executemany("DELETE FROM dous_fts_chaves WHERE id = ? AND idMateria = ?", pairs)
+
+
+def phrase_query(terms, column=None):
+    """
+    Monta uma expressão MATCH com OR entre as frases. Cada frase vira um
+    prefixo (como o LIKE '%...%' que substitui, aceita plural e sufixos).
+    """
+    phrases = " OR ".join('"' + term.replace('"', '""') + '"*' for term in terms)
+    return f"{column} : ({phrases})" if column else phrases
+
+
+def match_keys(terms, column="texto", path=None):
+    """Retorna as chaves (id, idMateria) cujo `column` contém alguma das frases."""
+    with _connect(path) as conn:
+        rows = conn.execute(
+            "SELECT c.id, c.idMateria FROM dous_fts JOIN dous_fts_chaves c ON c.rowid = dous_fts.rowid "
+            "WHERE dous_fts MATCH ?",
+            (phrase_query(terms, column),),
+        )
+        return [(row[0], row[1]) for row in rows]
+
+
+def _free_text_query(query):
+    # Cada palavra da busca vira um termo entre aspas (evita erros de sintaxe
+    # do FTS5 com pontuação digitada pelo usuário)
+    words = re.findall(r"\w+", query)
+    return " ".join('"' + word + '"' for word in words)
+
+
+def search(query, limit=20, path=None):
+    """Busca ranqueada (bm25) em Identifica, Ementa e texto."""
+    match = _free_text_query(query)
+    if not match:
+        return []
+    with _connect(path) as conn:
+        rows = conn.execute(
+            f"""
+            SELECT c.id, c.idMateria, Identifica, Ementa, artType, artCategory, pubDate,
+                   snippet(dous_fts, 2, '[', ']', '…', 20),
+                   bm25(dous_fts, {', '.join(str(w) for w in BM25_WEIGHTS)}) AS score
+            FROM dous_fts
+            JOIN dous_fts_chaves c ON c.rowid = dous_fts.rowid
+            WHERE dous_fts MATCH ?
+            ORDER BY score
+            LIMIT ?
+            """,
+            (match, limit),
+        )
+        return [
+            {
+                "id": row[0],
+                "idMateria": row[1],
+                "Identifica": row[2],
+                "Ementa": row[3],
+                "artType": row[4],
+                "artCategory": row[5],
+                "pubDate": row[6],
+                "trecho": row[7],
+                "score": -row[8],
+            }
+            for row in rows
+        ]
@@ -0,0 +1,291 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+
+def make_key(*parts):
+    """Chave estável (sha1) a partir de partes serializáveis em JSON."""
+    payload = json.dumps(parts, sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class CacheEntry:
+    def __init__(self, key, value):
+        self.key = key
+        self.value = value
+        self.created_at = time.time()
+
+
+class _InFlight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.entry = None
+        self.error = None
+
+
+class SingleFlightCache:
+    """
+    Cache LRU em memória com coalescência de chamadas: requisições simultâneas
+    pela mesma chave esperam uma única computação em andamento em vez de
+    repetir o trabalho.
+    """
+
+    def __init__(self, max_entries=8):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get_or_compute(self, key, compute):
+        """
+        Retorna (CacheEntry, origem), onde origem é "hit", "coalesced" ou
+        "miss". Exceções de `compute` são repassadas a todos os que esperavam
+        e nada é guardado.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry, "hit"
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = self._in_flight[key] = _InFlight()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.entry, "coalesced"
+
+        try:
+            call.entry = CacheEntry(key, compute())
+            with self._lock:
+                self._entries[key] = call.entry
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return call.entry, "miss"
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._in_flight[key]
+            call.done.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced, "entries": len(self._entries)}
+
+
+class PersistentCache:
+    """
+    Cache chave → valor (serializável em JSON) guardado em SQLite, que
+    sobrevive a reinícios do processo. Entradas mais antigas que `ttl`
+    segundos expiram; acima de `max_entries` as menos usadas recentemente
+    são descartadas.
+    """
+
+    def __init__(self, path, max_entries=10000, ttl=None):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_accessed_at ON cache (accessed_at)")
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            yield conn
+            conn.commit()
+        finally:
+            conn.close()
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key):
+        """Retorna (encontrado, valor)."""
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+            if row is not None and self.ttl is not None and now - row[1] > self.ttl:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+                row = None
+            if row is not None:
+                conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self._count(row is not None)
+        return (True, json.loads(row[0])) if row is not None else (False, None)
+
+    def set(self, key, value):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), now, now),
+            )
+            conn.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+
+    def get_or_compute(self, key, compute):
+        """
+        Retorna (valor, origem), onde origem é "hit" ou "miss". Exceções de
+        `compute` são repassadas e nada é guardado.
+        """
+        found, value = self.get(key)
+        if found:
+            return value, "hit"
+        value = compute()
+        self.set(key, value)
+        return value, "miss"
+
+    def clear(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM cache")
+
+    def stats(self):
+        with self._connect() as conn:
+            entries = conn.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
+
+
+class SizedLRUCache:
+    """
+    Cache LRU em memória limitado pelo tamanho aproximado dos valores
+    (`sizeof(valor)` em bytes, até `max_bytes`). Com `spill` (um
+    PersistentCache) as entradas que saem da memória vão para o disco e são
+    recuperadas de lá num acesso posterior; `dump`/`load` convertem o valor
+    de e para a forma serializável em JSON.
+    """
+
+    def __init__(self, max_bytes, sizeof, spill=None, dump=None, load=None):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.spill = spill
+        self.dump = dump or (lambda value: value)
+        self.load = load or (lambda value: value)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.spill_hits = 0
+        self.misses = 0
+
+    def _store(self, key, value, size):
+        # Chamado com o lock; devolve o que saiu da memória para ir ao disco
+        evicted = []
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self._bytes -= old[1]
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes and len(self._entries) > 1:
+            old_key, (old_value, old_size) = self._entries.popitem(last=False)
+            self._bytes -= old_size
+            evicted.append((old_key, old_value))
+        return evicted
+
+    def _spill(self, evicted):
+        if self.spill is not None:
+            for key, value in evicted:
+                try:
+                    self.spill.set(key, self.dump(value))
+                except (TypeError, ValueError):
+                    # Valor sem representação em JSON: fica só na memória
+                    pass
+
+    def _lookup(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0], "hit"
+        if self.spill is not None:
+            found, stored = self.spill.get(key)
+            if found:
+                value = self.load(stored)
+                self.set(key, value)
+                with self._lock:
+                    self.spill_hits += 1
+                return value, "disk"
+        with self._lock:
+            self.misses += 1
+        return None, "miss"
+
+    def get(self, key):
+        """Retorna (encontrado, valor), procurando na memória e depois no disco."""
+        value, origin = self._lookup(key)
+        return origin != "miss", value
+
+    def set(self, key, value):
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            # Maior que o cache inteiro: só o disco, se houver
+            self._spill([(key, value)])
+            return
+        with self._lock:
+            evicted = self._store(key, value, size)
+        self._spill(evicted)
+
+    def get_or_compute(self, key, compute):
+        """
+        Retorna (valor, origem), onde origem é "hit" (memória), "disk" ou
+        "miss". Exceções de `compute` são repassadas e nada é guardado.
+        """
+        value, origin = self._lookup(key)
+        if origin != "miss":
+            return value, origin
+        value = compute()
+        self.set(key, value)
+        return value, "miss"
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.spill is not None:
+            self.spill.clear()
+
+    def stats(self):
+        with self._lock:
+            stats = {"hits": self.hits, "disk_hits": self.spill_hits, "misses": self.misses,
+                     "entries": len(self._entries), "bytes": self._bytes}
+        if self.spill is not None:
+            stats["disk_entries"] = self.spill.stats()["entries"]
+        return stats
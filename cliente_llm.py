@@ -0,0 +1,222 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import PersistentCache, make_key
+from metricas import registry
+
+logger = logging.getLogger(__name__)
+
+# Servidor de completions do LM Studio (API compatível com a da OpenAI)
+LLM_URL = os.environ.get("DOUS_LLM_URL", "http://10.2.3.63:1234/v1/completions")
+LLM_MAX_TOKENS = int(os.environ.get("DOUS_LLM_MAX_TOKENS", "4096"))
+# Tempo máximo (segundos) para conectar e para receber a resposta
+LLM_CONNECT_TIMEOUT = float(os.environ.get("DOUS_LLM_CONNECT_TIMEOUT", "5"))
+LLM_READ_TIMEOUT = float(os.environ.get("DOUS_LLM_READ_TIMEOUT", "300"))
+LLM_RETRIES = int(os.environ.get("DOUS_LLM_RETRIES", "3"))
+LLM_BACKOFF = float(os.environ.get("DOUS_LLM_BACKOFF", "1"))
+# Requisições simultâneas por lote (e conexões mantidas abertas)
+LLM_CONCURRENCY = int(os.environ.get("DOUS_LLM_CONCURRENCY", "4"))
+
+# Cache persistente das respostas do modelo (temperatura 0: mesma entrada,
+# mesma saída). DOUS_LLM_CACHE_PATH vazio desativa; TTL 0 = sem expiração
+LLM_CACHE_PATH = os.environ.get("DOUS_LLM_CACHE_PATH", "./dous_llm_cache.db")
+LLM_CACHE_MAX_ENTRIES = int(os.environ.get("DOUS_LLM_CACHE_MAX_ENTRIES", "10000"))
+LLM_CACHE_TTL = float(os.environ.get("DOUS_LLM_CACHE_TTL", str(30 * 24 * 3600))) or None
+
+_llm_cache = None
+_llm_cache_lock = threading.Lock()
+
+
+def get_llm_cache():
+    """
+    Cache persistente compartilhado das respostas do modelo, aberto só no
+    primeiro uso (importar o módulo não cria o arquivo). None se desativado.
+    """
+    global _llm_cache
+    if _llm_cache is None and LLM_CACHE_PATH:
+        with _llm_cache_lock:
+            if _llm_cache is None:
+                _llm_cache = PersistentCache(LLM_CACHE_PATH, LLM_CACHE_MAX_ENTRIES, LLM_CACHE_TTL)
+    return _llm_cache
+
+
+# Padrão do LLMClient: usa o cache compartilhado (get_llm_cache)
+SHARED_CACHE = object()
+
+# Status HTTP que valem nova tentativa (sobrecarga ou falha temporária)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class LLMError(Exception):
+    """Falha ao obter resposta do modelo depois de todas as tentativas."""
+
+
+class LLMClient:
+    """
+    Cliente HTTP do servidor de completions. Mantém as conexões abertas
+    (requests.Session), aplica timeout e novas tentativas com espera
+    exponencial em cada chamada e executa lotes de prompts em paralelo, com
+    no máximo `concurrency` requisições simultâneas.
+    """
+
+    def __init__(self, url=LLM_URL, max_tokens=LLM_MAX_TOKENS, timeout=(LLM_CONNECT_TIMEOUT, LLM_READ_TIMEOUT),
+                 retries=LLM_RETRIES, backoff=LLM_BACKOFF, concurrency=LLM_CONCURRENCY, cache=SHARED_CACHE):
+        self.url = url
+        self.max_tokens = max_tokens
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.concurrency = max(1, concurrency)
+        self._cache = cache
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def cache(self):
+        """Cache das respostas (None = sem cache), resolvido no primeiro uso."""
+        if self._cache is SHARED_CACHE:
+            return get_llm_cache()
+        return self._cache
+
+    def payload(self, prompt, model, **params):
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "max_tokens": self.max_tokens,
+            "temperature": 0.0,
+            "top_p": 0.7,  # só considera as palavras mais prováveis cuja soma das probabilidades chega a 0.7
+        }
+        payload.update(params)
+        return payload
+
+    def _request(self, payload, stream=False):
+        """Resposta HTTP bem-sucedida, com novas tentativas em falhas temporárias."""
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout, stream=stream)
+                if response.status_code in RETRY_STATUS and attempt < self.retries:
+                    raise requests.HTTPError(f"{response.status_code} {response.reason}", response=response)
+                response.raise_for_status()
+                return response
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as e:
+                status = e.response.status_code if e.response is not None else None
+                if e.response is not None:
+                    # Devolve a conexão ao pool (a resposta pode estar em streaming)
+                    e.response.close()
+                retryable = status is None or status in RETRY_STATUS
+                if not retryable or attempt == self.retries:
+                    registry.inc("dous_llm_falhas_total")
+                    raise LLMError(f"Erro ao conectar à API do LM Studio: {e}") from e
+                delay = self.backoff * 2 ** attempt * (1 + random.random())
+                registry.inc("dous_llm_retentativas_total")
+                logger.warning("Falha na chamada ao LLM (%s); nova tentativa em %.1fs", e, delay)
+                time.sleep(delay)
+
+    def _post(self, payload):
+        response = self._request(payload)
+        try:
+            text = response.json().get('choices', [{}])[0].get('text', '').strip()
+        except ValueError as e:
+            raise LLMError(f"Resposta inválida da API do LM Studio: {e}") from e
+        registry.observe("dous_llm_requisicao_segundos", response.elapsed.total_seconds())
+        return text
+
+    def complete(self, prompt, model, stop=None, **params):
+        """Texto gerado para `prompt`, consultando antes o cache persistente."""
+        payload = self.payload(prompt, model, **params)
+        if stop:
+            payload["stop"] = stop
+        cache = self.cache
+        if cache is None:
+            return self._post(payload)
+
+        # A chave cobre servidor, modelo, prompt e parâmetros de amostragem
+        key = make_key(self.url, payload)
+        text, origem = cache.get_or_compute(key, lambda: self._post(payload))
+        registry.inc("dous_llm_cache_total", resultado=origem)
+        return text
+
+    def stream(self, prompt, model, stop=None, **params):
+        """
+        Gera o texto de `prompt` em pedaços, à medida que o modelo produz os
+        tokens (modo stream da API, em Server-Sent Events). Novas tentativas
+        só acontecem antes do primeiro token. O texto completo vai para o
+        cache no final; uma resposta já em cache sai num único pedaço.
+        """
+        payload = self.payload(prompt, model, **params)
+        if stop:
+            payload["stop"] = stop
+        key = None
+        cache = self.cache
+        if cache is not None:
+            # Mesma chave do complete(): as duas formas compartilham o cache
+            key = make_key(self.url, payload)
+            found, text = cache.get(key)
+            registry.inc("dous_llm_cache_total", resultado="hit" if found else "miss")
+            if found:
+                yield text
+                return
+
+        started = time.perf_counter()
+        response = self._request({**payload, "stream": True}, stream=True)
+        parts = []
+        try:
+            # chunk_size=None: cada linha sai assim que chega, sem esperar encher um buffer
+            for line in response.iter_lines(chunk_size=None):
+                line = line.decode("utf-8")
+                if not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                try:
+                    text = json.loads(data).get("choices", [{}])[0].get("text", "")
+                except ValueError as e:
+                    raise LLMError(f"Evento inválido no stream do LM Studio: {e}") from e
+                if not text:
+                    continue
+                if not parts:
+                    registry.observe("dous_llm_primeiro_token_segundos", time.perf_counter() - started)
+                parts.append(text)
+                yield text
+        except requests.RequestException as e:
+            registry.inc("dous_llm_falhas_total")
+            raise LLMError(f"Stream do LM Studio interrompido: {e}") from e
+        finally:
+            response.close()
+
+        registry.observe("dous_llm_requisicao_segundos", time.perf_counter() - started)
+        if key is not None:
+            cache.set(key, "".join(parts).strip())
+
+    def complete_many(self, prompts, model, stop=None, **params):
+        """Completa vários prompts em paralelo; a ordem das respostas é a dos prompts."""
+        prompts = list(prompts)
+        if len(prompts) <= 1 or self.concurrency == 1:
+            return [self.complete(prompt, model, stop, **params) for prompt in prompts]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="llm")
+        futures = [self._executor.submit(self.complete, prompt, model, stop, **params) for prompt in prompts]
+        return [future.result() for future in futures]
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self.session.close()
+
+
+# Cliente compartilhado pelo wrapper do langchain e pela extração de tabelas
+client = LLMClient()
@@ -0,0 +1,150 @@
+import logging
+import math
+import os
+import re
+from decimal import Decimal
+
+from send import clean_html
+
+logger = logging.getLogger(__name__)
+
+# Orçamento do contexto enviado ao format_response, em tokens estimados
+CONTEXTO_MAX_TOKENS = int(os.environ.get("DOUS_ASK_CONTEXTO_TOKENS", "1500"))
+# Linhas listadas no contexto (as demais entram só nos resumos)
+CONTEXTO_MAX_LINHAS = int(os.environ.get("DOUS_ASK_CONTEXTO_LINHAS", "20"))
+# Sem tokenizador do modelo à mão: ~4 caracteres por token em português
+CARACTERES_POR_TOKEN = 4
+
+# Tamanho máximo de cada valor, por coluna (as demais usam o padrão)
+LIMITE_POR_COLUNA = {
+    "texto": 300,
+    "body": 300,
+    "ementa": 250,
+    "identifica": 150,
+    "titulo": 150,
+    "subtitulo": 150,
+    "name": 120,
+    "artcategory": 120,
+}
+LIMITE_PADRAO = 80
+# Colunas com até este número de valores distintos ganham contagem por valor
+MAX_CATEGORIAS = 8
+
+_VALOR = re.compile(r"valor", re.IGNORECASE)
+_UF = re.compile(r"^(uf|estado)$", re.IGNORECASE)
+# Número no formato brasileiro com separador de milhar: "1.500", "1.234,56"
+_MILHAR = re.compile(r"^\d{1,3}(\.\d{3})+(,\d+)?$")
+
+
+def estimar_tokens(texto):
+    return math.ceil(len(texto) / CARACTERES_POR_TOKEN)
+
+
+def _limite(coluna):
+    return LIMITE_POR_COLUNA.get(str(coluna).lower(), LIMITE_PADRAO)
+
+
+def formatar_valor(coluna, valor):
+    """Valor em uma linha, sem HTML e cortado no limite da coluna."""
+    if isinstance(valor, str):
+        texto = clean_html(valor) if "<" in valor else valor
+    else:
+        texto = str(valor)
+    texto = " ".join(texto.split())
+    limite = _limite(coluna)
+    return texto if len(texto) <= limite else texto[:limite] + "..."
+
+
+def _numero(valor):
+    if isinstance(valor, bool) or valor is None:
+        return None
+    if isinstance(valor, (int, float, Decimal)):
+        return float(valor)
+    texto = str(valor).strip().replace("R$", "").strip()
+    # Vírgula decimal, ou pontos só como milhar ("1.500" é mil e quinhentos;
+    # "1.5" continua um e meio)
+    if "," in texto or _MILHAR.match(texto):
+        texto = texto.replace(".", "").replace(",", ".")
+    try:
+        return float(texto)
+    except ValueError:
+        return None
+
+
+def _moeda(valor):
+    return f"{valor:,.2f}".replace(",", "_").replace(".", ",").replace("_", ".")
+
+
+def resumir(colunas, linhas):
+    """
+    Resumo agregado do resultado: total de linhas, colunas com valor único,
+    soma das colunas de valor, UFs distintas e contagem das colunas com
+    poucas categorias.
+    """
+    partes = [f"Total de linhas: {len(linhas)}"]
+    if not linhas:
+        return partes
+
+    constantes = []
+    for i, coluna in enumerate(colunas):
+        valores = [linha[i] for linha in linhas if linha[i] is not None and linha[i] != ""]
+        if not valores:
+            continue
+        distintos = list(dict.fromkeys(valores))
+
+        if _VALOR.search(str(coluna)):
+            numeros = [n for n in map(_numero, valores) if n is not None]
+            if numeros:
+                partes.append(f"Soma de {coluna}: {_moeda(sum(numeros))} ({len(numeros)} valores)")
+                continue
+        if _UF.match(str(coluna)):
+            ufs = sorted({str(v).strip().upper() for v in valores})
+            partes.append(f"{coluna} distintas ({len(ufs)}): {', '.join(ufs)}")
+            continue
+        if len(linhas) > 1 and len(distintos) == 1 and len(valores) == len(linhas):
+            constantes.append(f"{coluna}={formatar_valor(coluna, distintos[0])}")
+        elif 1 < len(distintos) <= MAX_CATEGORIAS < len(linhas) and not isinstance(distintos[0], (int, float)):
+            contagem = {formatar_valor(coluna, v): valores.count(v) for v in distintos}
+            ordenada = sorted(contagem.items(), key=lambda item: -item[1])
+            partes.append(f"{coluna} (contagem): " + "; ".join(f"{v} ({n})" for v, n in ordenada))
+
+    if constantes:
+        partes.append("Igual em todas as linhas: " + "; ".join(constantes))
+    return partes
+
+
+def compactar_resultado(colunas, linhas, max_tokens=CONTEXTO_MAX_TOKENS, max_linhas=CONTEXTO_MAX_LINHAS):
+    """
+    Contexto compacto do resultado de uma consulta para o prompt do
+    format_response: resumo agregado seguido das primeiras linhas (com os
+    valores cortados por coluna) até `max_linhas` ou até o orçamento de
+    `max_tokens` tokens estimados, que nunca é ultrapassado.
+    """
+    colunas = list(colunas)
+    linhas = [tuple(linha) for linha in linhas]
+    orcamento = max_tokens * CARACTERES_POR_TOKEN
+
+    partes = resumir(colunas, linhas)
+    # Colunas com o mesmo valor em todas as linhas já estão no resumo
+    variaveis = [i for i in range(len(colunas)) if len(linhas) == 1 or len({linha[i] for linha in linhas}) > 1]
+
+    texto = "\n".join(partes)
+    listadas = 0
+    if linhas and variaveis:
+        texto += "\nLinhas:"
+        for linha in linhas[:max_linhas]:
+            campos = "; ".join(f"{colunas[i]}={formatar_valor(colunas[i], linha[i])}"
+                               for i in variaveis if linha[i] is not None and linha[i] != "")
+            entrada = f"\n{listadas + 1}. {campos}"
+            # Reserva espaço para a nota de linhas omitidas
+            if len(texto) + len(entrada) + 40 > orcamento:
+                break
+            texto += entrada
+            listadas += 1
+        if listadas < len(linhas):
+            texto += f"\n(mais {len(linhas) - listadas} linhas omitidas)"
+
+    if len(texto) > orcamento:
+        texto = texto[:max(0, orcamento - 3)] + "..."
+    logger.debug("Contexto compactado: %d linhas → %d listadas, ~%d tokens", len(linhas), listadas, estimar_tokens(texto))
+    return texto
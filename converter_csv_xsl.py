@@ -1,13 +1,17 @@
 import pandas as pd
 
+from exportacao import WorkbookWriter
+
 # Nome do arquivo CSV e do arquivo XLS
 csv_file = 'portarias.csv'
 xls_file = 'portarias.xls'
 
-# Ler o CSV, ignorando linhas problemáticas
-df = pd.read_csv(csv_file, sep=';', encoding='utf-8-sig')
+# Linhas lidas do CSV por vez
+chunk_size = 50000
 
-# Salvar como XLSX
-df.to_excel('dfs.xlsx', index=False, engine='openpyxl')
+# Ler o CSV em pedaços e gravar cada um direto na planilha (memória constante)
+with WorkbookWriter('dfs.xlsx', sheet_name='Sheet1') as writer:
+    for df in pd.read_csv(csv_file, sep=';', encoding='utf-8-sig', chunksize=chunk_size):
+        writer.append(df)
 
-print(f'Arquivo salvo como dfs.xlsx')
\ No newline at end of file
+print(f'Arquivo salvo como dfs.xlsx ({writer.rows_written} linhas em {writer.sheets} aba(s))')
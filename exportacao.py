@@ -0,0 +1,140 @@
+import json
+
+import pandas as pd
+import xlsxwriter
+
+# Linhas serializadas por pedaço enviado ao cliente
+STREAM_CHUNK_ROWS = 1000
+
+
+def project(df, fields=None, offset=0, limit=None):
+    """
+    Aplica paginação e projeção de colunas sem copiar o DataFrame inteiro:
+    as linhas são fatiadas antes, e só a página é copiada na projeção.
+    Levanta KeyError para colunas inexistentes.
+    """
+    if fields:
+        missing = [field for field in fields if field not in df.columns]
+        if missing:
+            raise KeyError(f"Colunas inexistentes: {', '.join(missing)}")
+    end = None if limit is None else offset + limit
+    df = df.iloc[offset:end]
+    return df[fields] if fields else df
+
+
+def _chunks(df, chunk_rows):
+    for start in range(0, len(df), chunk_rows):
+        yield df.iloc[start:start + chunk_rows]
+
+
+def _records(chunk):
+    # NaN não é JSON válido: vira null
+    return chunk.astype(object).where(chunk.notna(), None).to_dict(orient="records")
+
+
+def iter_ndjson(df, chunk_rows=STREAM_CHUNK_ROWS):
+    """Gera o DataFrame como NDJSON, um registro por linha."""
+    for chunk in _chunks(df, chunk_rows):
+        yield "".join(
+            json.dumps(record, ensure_ascii=False, default=str) + "\n"
+            for record in _records(chunk)
+        )
+
+
+def iter_json(df, extra=None, chunk_rows=STREAM_CHUNK_ROWS):
+    """
+    Gera {"data": [...], "count": N, ...extra} em pedaços, sem montar a lista
+    completa de registros em memória.
+    """
+    yield '{"data": ['
+    first = True
+    for chunk in _chunks(df, chunk_rows):
+        records = _records(chunk)
+        if not records:
+            continue
+        body = ", ".join(json.dumps(record, ensure_ascii=False, default=str) for record in records)
+        yield body if first else ", " + body
+        first = False
+    tail = {"count": len(df), **(extra or {})}
+    yield "], " + json.dumps(tail, ensure_ascii=False, default=str)[1:]
+
+
+def iter_csv(df, sep=";", chunk_rows=STREAM_CHUNK_ROWS):
+    """Gera o CSV em pedaços; a formatação é a mesma do DataFrame.to_csv."""
+    header = True
+    for chunk in _chunks(df, chunk_rows):
+        yield chunk.to_csv(index=False, sep=sep, header=header)
+        header = False
+    if header:
+        # DataFrame vazio: ainda assim envia o cabeçalho
+        yield df.to_csv(index=False, sep=sep)
+
+
+class WorkbookWriter:
+    """
+    Planilha .xlsx escrita de forma incremental em modo de memória constante
+    (xlsxwriter constant_memory): cada linha vai para o disco assim que é
+    escrita. Ao atingir o limite de linhas do Excel abre uma nova aba com o
+    mesmo cabeçalho.
+    """
+
+    MAX_ROWS = 1048576
+
+    def __init__(self, target, sheet_name="Portarias", columns=None, max_rows=MAX_ROWS):
+        self.workbook = xlsxwriter.Workbook(target, {"constant_memory": True})
+        self.sheet_name = sheet_name
+        self.columns = list(columns) if columns is not None else None
+        self.max_rows = max_rows
+        self.sheets = 0
+        self.rows_written = 0
+        self._worksheet = None
+        self._row = 0
+
+    def _new_sheet(self):
+        self.sheets += 1
+        name = self.sheet_name if self.sheets == 1 else f"{self.sheet_name}_{self.sheets}"
+        self._worksheet = self.workbook.add_worksheet(name[:31])
+        self._worksheet.write_row(0, 0, self.columns)
+        self._row = 1
+
+    def align(self, df):
+        """
+        DataFrame com as colunas da planilha (as da primeira chamada), na
+        mesma ordem. Levanta ValueError para rótulos duplicados, antes de
+        qualquer escrita.
+        """
+        labels = pd.Index([str(col) for col in df.columns])
+        if labels.has_duplicates:
+            raise ValueError(f"Colunas duplicadas: {', '.join(labels[labels.duplicated()].unique())}")
+        if self.columns is None:
+            self.columns = list(labels)
+        if not labels.equals(df.columns):
+            df = df.set_axis(labels, axis=1)
+        if list(labels) != self.columns:
+            df = df.reindex(columns=self.columns)
+        return df
+
+    def append(self, df, chunk_rows=STREAM_CHUNK_ROWS):
+        """Acrescenta as linhas do DataFrame (alinhado com align)."""
+        df = self.align(df)
+        for chunk in _chunks(df, chunk_rows):
+            values = chunk.astype(object).where(chunk.notna(), None)
+            for row in values.itertuples(index=False, name=None):
+                if self._worksheet is None or self._row >= self.max_rows:
+                    self._new_sheet()
+                self._worksheet.write_row(self._row, 0, row)
+                self._row += 1
+                self.rows_written += 1
+
+    def close(self):
+        if self._worksheet is None:
+            # Planilha sem linhas: mantém ao menos o cabeçalho
+            self.columns = self.columns or []
+            self._new_sheet()
+        self.workbook.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
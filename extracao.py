@@ -0,0 +1,383 @@
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
+import pandas as pd
+from sqlalchemy import select, text
+
+from busca import index_available, match_keys
+from cache import make_key
+from exportacao import WorkbookWriter
+from loader import dous_table, key_clause
+from metricas import registry
+from pln import corrigir_tabela
+from send import get_engine, stream_query
+from utils import PortariaDocument, clean_data, standardize_dataframe
+
+logger = logging.getLogger(__name__)
+
+# Critérios de seleção das portarias do Ministério da Saúde
+PORTARIA_COLUNAS = "id, texto, pubName, pubDate, artType, artCategory, Ementa"
+PORTARIA_FILTRO = "artType = 'Portaria' AND artCategory LIKE 'Ministério da Saúde%'"
+PORTARIA_TERMOS = [
+    "incremento temporário",
+    "rateio dos recursos de transferência",
+    "emendas parlamentares",
+    "aplicação de emenda",
+    "atenção especializada à saúde",
+    "relatório anual de gestão RAG",
+    "Bloco de Manutenção das Ações e Serviços Públicos de Saúde",
+]
+
+# Processos usados no parse/padronização das portarias (padrão: número de CPUs).
+# É o limite global: todas as extrações, inclusive as concorrentes, dividem
+# o mesmo pool
+EXTRACAO_WORKERS = int(os.environ.get("DOUS_EXTRACAO_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def extraction_key(data_version):
+    """Chave de cache da extração: critérios de seleção + versão dos dados."""
+    return make_key("extrair-portarias", PORTARIA_COLUNAS, PORTARIA_FILTRO, PORTARIA_TERMOS, data_version)
+
+
+class ExtractionCancelled(Exception):
+    """A extração foi cancelada antes de terminar."""
+
+
+def buscar_portarias():
+    """
+    Gera as portarias que atendem aos critérios, em streaming (stream_query):
+    as linhas chegam aos poucos e o resultado nunca fica inteiro na memória.
+    Com o índice de texto completo em dia com os dados os termos são
+    resolvidos nele e o banco só filtra pelas chaves (id, idMateria); sem
+    índice, ou com índice de outra versão dos dados, cai na varredura com LIKE.
+    """
+    engine = get_engine()
+    if index_available(engine):
+        keys = match_keys(PORTARIA_TERMOS)
+        logger.info("Índice de texto: %d chaves encontradas", len(keys))
+        # Limite de parâmetros por comando do SQL Server é 2100 (2 por chave)
+        for start in range(0, len(keys), 1000):
+            query = (
+                select(text(PORTARIA_COLUNAS))
+                .select_from(dous_table)
+                .where(text(PORTARIA_FILTRO), key_clause(engine.dialect, keys[start:start + 1000]))
+            )
+            yield from stream_query(query)
+        return
+
+    termos = " OR ".join(f"texto LIKE '%{termo}%'" for termo in PORTARIA_TERMOS)
+    yield from stream_query(f"SELECT {PORTARIA_COLUNAS} FROM dous WHERE {PORTARIA_FILTRO} AND ({termos})")
+
+
+STAGE_METRIC = "dous_extracao_etapa_segundos"
+
+
+class StageTimer:
+    """
+    Acumula o tempo gasto em cada etapa da extração. Com record=True cada
+    medição também vai para o histograma de etapas do /metrics.
+    """
+
+    def __init__(self, record=True):
+        self.timings = {}
+        self.record = record
+
+    def add(self, name, elapsed):
+        self.timings[name] = self.timings.get(name, 0.0) + elapsed
+        if self.record:
+            registry.observe(STAGE_METRIC, elapsed, etapa=name)
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def iterate(self, name, iterable):
+        """
+        Gera os itens de `iterable` contando em `name` só o tempo de espera
+        por cada item (ex.: o fetch do banco), registrado uma vez no final.
+        """
+        elapsed = 0.0
+        iterator = iter(iterable)
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - started
+                yield item
+        finally:
+            if hasattr(iterator, "close"):
+                iterator.close()
+            self.add(name, elapsed)
+
+
+def _add_metadata(df, portaria_info):
+    df['numero da portaria'] = portaria_info.get('numero_portaria', '')
+    df['data'] = portaria_info.get('data_portaria', '')
+    return df
+
+
+def process_portaria(idx, texto_portaria, finalize=True):
+    """
+    Etapa pura de uma portaria (sem banco nem LLM), executável num processo
+    separado: extrai número/data e tabelas e padroniza cada tabela. Com
+    finalize=True também adiciona os metadados e faz a limpeza.
+
+    Retorna {"idx", "info", "tables", "errors", "timings"}; falhas ficam
+    registradas em "errors" sem interromper as demais portarias.
+    """
+    # Pode rodar em outro processo: os tempos voltam no resultado e são
+    # registrados no processo principal
+    timer = StageTimer(record=False)
+    result = {"idx": idx, "info": {}, "tables": [], "errors": [], "timings": timer.timings}
+    try:
+        with timer.stage("parse"):
+            documento = PortariaDocument(texto_portaria)
+            portaria_info = documento.info
+            tables = documento.tables
+        result["info"] = portaria_info
+    except Exception as e:
+        result["errors"].append(f"Erro ao processar portaria {idx + 1}: {str(e)}")
+        return result
+
+    for table_df in tables:
+        try:
+            with timer.stage("standardize"):
+                standardized_df = standardize_dataframe(table_df, portaria_info)
+            if finalize:
+                _add_metadata(standardized_df, portaria_info)
+                with timer.stage("clean"):
+                    standardized_df = clean_data(standardized_df)
+            result["tables"].append(standardized_df)
+        except Exception as e:
+            result["errors"].append(f"Erro ao processar tabela: {str(e)}")
+    return result
+
+
+def _next_result(pending, ordered):
+    if ordered:
+        future = pending.popleft()
+    else:
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        future = next(iter(done))
+        pending.remove(future)
+    try:
+        return future.result()
+    except Exception as e:
+        # Falha do próprio processo (ex.: resultado que não pôde ser serializado)
+        return {"idx": future.idx, "info": {}, "tables": [], "timings": {},
+                "errors": [f"Erro ao processar portaria {future.idx + 1}: {str(e)}"]}
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _mp_context():
+    # O servidor web tem várias threads: fork copiaria travas em uso, então
+    # os processos saem de um forkserver (ou spawn, onde não há forkserver)
+    metodos = multiprocessing.get_all_start_methods()
+    return multiprocessing.get_context("forkserver" if "forkserver" in metodos else "spawn")
+
+
+def get_pool():
+    """Pool de processos da extração, único no processo e criado no primeiro uso."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=EXTRACAO_WORKERS, mp_context=_mp_context())
+    return _pool
+
+
+def _discard_pool(pool):
+    # Um processo que morre quebra o pool inteiro: o próximo uso cria outro
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def map_portarias(items, workers=None, ordered=True, finalize=True, max_in_flight=None):
+    """
+    Aplica process_portaria aos pares (idx, texto) no pool de processos
+    compartilhado (get_pool) e gera os resultados na ordem de entrada
+    (ordered=True) ou conforme ficam prontos. No máximo `max_in_flight`
+    portarias desta chamada ficam em andamento por vez (padrão: 4 por
+    worker); fechar o gerador cancela as que ainda não começaram.
+    Com workers=1 o processamento roda no próprio processo.
+    """
+    workers = workers or EXTRACAO_WORKERS
+    if workers == 1:
+        for idx, texto_portaria in items:
+            yield process_portaria(idx, texto_portaria, finalize)
+        return
+
+    max_in_flight = max_in_flight or min(workers, EXTRACAO_WORKERS) * 4
+    executor = get_pool()
+    pending = deque()
+    try:
+        for idx, texto_portaria in items:
+            try:
+                future = executor.submit(process_portaria, idx, texto_portaria, finalize)
+            except BrokenProcessPool:
+                _discard_pool(executor)
+                raise
+            future.idx = idx
+            pending.append(future)
+            if len(pending) >= max_in_flight:
+                yield _next_result(pending, ordered)
+        while pending:
+            yield _next_result(pending, ordered)
+    finally:
+        # O pool continua vivo para as próximas extrações
+        for future in pending:
+            future.cancel()
+
+
+def run_extraction(output_dir=".", on_progress=None, cancel_event=None, timer=None,
+                   llm=None, workers=None, ordered=True):
+    """
+    Executa a extração completa: consulta → parse → padronização → correção
+    com LLM → limpeza → exportação.
+
+    Parse e padronização rodam em paralelo (map_portarias, `workers`
+    processos); a correção com `llm`, quando informada (só as linhas de cada
+    tabela, em janelas), e a escrita dos arquivos ficam no processo atual.
+
+    As portarias vêm do banco em streaming (buscar_portarias), então o parse
+    começa antes de a consulta terminar. `on_progress(processadas, total,
+    tabelas, erros)` é chamado após cada portaria, com total None até o fim
+    do streaming; se `cancel_event` for sinalizado a extração é interrompida
+    com ExtractionCancelled. Retorna um dicionário com "data" (DataFrame
+    unificado ou None), "message", "artifacts" (nome → caminho) e "timings".
+    """
+    timer = timer or StageTimer()
+    artifacts = {}
+
+    def _path(name):
+        path = os.path.join(output_dir, name)
+        artifacts[name] = path
+        return path
+
+    all_data = []
+    erros = 0
+    processadas = 0
+    csv_filename = os.path.join(output_dir, 'portarias.csv')
+    excel_filename = os.path.join(output_dir, 'portarias.xlsx')
+
+    # As portarias chegam do banco em streaming e seguem direto para o parse:
+    # fetch e processamento se sobrepõem e só as que estão em andamento ficam
+    # na memória
+    logger.info("Executando consulta SQL...")
+    portarias_txt = open(_path('portarias.txt'), 'w', encoding='utf-8')
+    portarias = timer.iterate("query", buscar_portarias())
+
+    def _textos():
+        for idx, portaria in enumerate(portarias):
+            with timer.stage("write"):
+                portarias_txt.write(f"{portaria}\n")
+            yield idx, portaria[1]
+
+    # Uma única planilha por execução, escrita incrementalmente
+    excel_writer = WorkbookWriter(excel_filename)
+    results = map_portarias(_textos(), workers=workers, ordered=ordered, finalize=not llm)
+    try:
+        for processadas, result in enumerate(results, start=1):
+            if cancel_event is not None and cancel_event.is_set():
+                registry.inc("dous_extracao_execucoes_total", resultado="cancelado")
+                raise ExtractionCancelled(f"Extração cancelada após {processadas - 1} portarias")
+
+            for stage, seconds in result["timings"].items():
+                timer.timings[stage] = timer.timings.get(stage, 0.0) + seconds
+                registry.observe(STAGE_METRIC, seconds, etapa=stage)
+            registry.inc("dous_extracao_portarias_total")
+            for message in result["errors"]:
+                erros += 1
+                registry.inc("dous_extracao_erros_total")
+                logger.warning(message)
+
+            portaria_info = result["info"]
+            logger.debug("Portaria %d: Nº %s - Data: %s - Tabelas: %d", result['idx'] + 1,
+                         portaria_info.get('numero_portaria'), portaria_info.get('data_portaria'), len(result['tables']))
+
+            for standardized_df in result["tables"]:
+                try:
+                    # Correção com LLM (se disponível), metadados e limpeza final
+                    if llm:
+                        with timer.stage("llm"):
+                            standardized_df = corrigir_tabela(standardized_df, llm)
+                        _add_metadata(standardized_df, portaria_info)
+                        with timer.stage("clean"):
+                            standardized_df = clean_data(standardized_df)
+
+                    # Salvar CSV e Excel: as colunas são conferidas e alinhadas
+                    # antes, para uma falha não deixar um arquivo à frente do outro
+                    with timer.stage("write"):
+                        aligned = excel_writer.align(standardized_df)
+                        aligned.to_csv(csv_filename, mode='a', index=False, encoding='utf-8-sig', sep=';', header=not os.path.exists(csv_filename))
+                        excel_writer.append(aligned)
+                    artifacts['portarias.csv'] = csv_filename
+                    artifacts['portarias.xlsx'] = excel_filename
+
+                    all_data.append(standardized_df)
+                    registry.inc("dous_extracao_tabelas_total")
+
+                except Exception as e:
+                    erros += 1
+                    registry.inc("dous_extracao_erros_total")
+                    logger.warning("Erro ao processar tabela: %s", e)
+                    continue
+
+            # O total só é conhecido quando o streaming termina
+            if on_progress is not None:
+                on_progress(processadas, None, len(all_data), erros)
+    finally:
+        results.close()
+        portarias.close()
+        portarias_txt.close()
+        excel_writer.close()
+
+    logger.info("Portarias retornadas: %d", processadas)
+    if on_progress is not None:
+        on_progress(processadas, processadas, len(all_data), erros)
+
+    if not processadas:
+        registry.inc("dous_extracao_execucoes_total", resultado="vazio")
+        return {"data": None, "message": "Nenhuma portaria encontrada com os critérios especificados",
+                "artifacts": artifacts, "timings": timer.timings}
+
+    if not all_data:
+        registry.inc("dous_extracao_execucoes_total", resultado="sem_tabelas")
+        return {"data": None, "message": "Nenhuma tabela válida encontrada",
+                "artifacts": artifacts, "timings": timer.timings}
+
+    with timer.stage("clean"):
+        final_df = pd.concat(all_data, ignore_index=True)
+        final_df = clean_data(final_df)
+
+    with timer.stage("write"):
+        with WorkbookWriter(_path('tabelas_unificadas.xlsx'), sheet_name='Sheet1') as writer:
+            aligned = writer.align(final_df)
+            aligned.to_csv(_path('tabelas_unificadas.csv'), index=False, encoding='utf-8-sig', sep=';')
+            writer.append(aligned)
+
+    logger.info("Tabela unificada salva: %d linhas", len(final_df))
+    registry.inc("dous_extracao_execucoes_total", resultado="ok")
+
+    return {"data": final_df, "message": None, "artifacts": artifacts, "timings": timer.timings}
@@ -0,0 +1,222 @@
+import logging
+import os
+import re
+import xml.etree.ElementTree as ET
+
+from loader import dous_table
+from metricas import registry
+from send import cached_result, get_engine, make_rows, normalize_sql
+
+logger = logging.getLogger(__name__)
+
+# Limites aplicados ao SQL gerado pela LLM no /ask
+GUARDA_MAX_LINHAS = int(os.environ.get("DOUS_SQL_MAX_LINHAS", "100"))
+# Tempo máximo (segundos) da consulta; menor que o padrão do engine
+GUARDA_TIMEOUT = int(os.environ.get("DOUS_SQL_TIMEOUT", "15"))
+# Valores de texto maiores que isto são cortados no resultado
+GUARDA_MAX_CARACTERES = int(os.environ.get("DOUS_SQL_MAX_CARACTERES", "1000"))
+# Custo máximo estimado pelo otimizador (unidades de cada banco); vazio desativa
+GUARDA_CUSTO_MAXIMO = float(os.environ.get("DOUS_SQL_CUSTO_MAXIMO", "0")) or None
+
+# Colunas com o texto integral da portaria: ficam fora do "SELECT *"
+COLUNAS_TEXTO_LONGO = ("Texto", "body")
+
+PALAVRAS_PROIBIDAS = (
+    "INSERT", "UPDATE", "DELETE", "MERGE", "DROP", "ALTER", "CREATE", "TRUNCATE",
+    "EXEC", "EXECUTE", "GRANT", "REVOKE", "DENY", "INTO", "ATTACH", "DETACH",
+    "PRAGMA", "BACKUP", "RESTORE", "SHUTDOWN", "DBCC", "OPENROWSET", "OPENQUERY",
+)
+
+_CERCA = re.compile(r"^\s*```(?:sql)?\s*|\s*```\s*$", re.IGNORECASE)
+_COMENTARIOS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+# Literais de texto e identificadores entre aspas/colchetes
+_LITERAIS = re.compile(r"'(?:[^']|'')*'|\"[^\"]*\"|\[[^\]]*\]")
+_PROIBIDAS = re.compile(r"\b(?:%s)\b" % "|".join(PALAVRAS_PROIBIDAS), re.IGNORECASE)
+_INICIO = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_TOP = re.compile(
+    r"^(\s*SELECT\s+(?:DISTINCT\s+)?)(?:TOP\s*\(?\s*(\d+)\s*\)?(?:\s+PERCENT)?\s+)?",
+    re.IGNORECASE,
+)
+_SELECT_OU_PARENTESES = re.compile(r"\bSELECT\b|[()]", re.IGNORECASE)
+_WITH = re.compile(r"^\s*WITH\b", re.IGNORECASE)
+_LIMIT = re.compile(r"\bLIMIT\s+(\d+)(\s+OFFSET\s+\d+)?\s*$", re.IGNORECASE)
+_ESTRELA = re.compile(
+    r"^(\s*SELECT\s+(?:DISTINCT\s+)?(?:TOP\s*\(?\s*\d+\s*\)?\s+)?)\*(\s+FROM\s+(?:\[?dbo\]?\.)?\[?dous\]?(?![\w.]))",
+    re.IGNORECASE,
+)
+
+
+class ConsultaRecusada(ValueError):
+    """O SQL gerado não passou pelas regras do guarda (não é uma leitura simples)."""
+
+
+def _sem_literais(sql):
+    # Mesmo comprimento do original: as posições continuam valendo no SQL
+    return _LITERAIS.sub(lambda m: m.group(0)[0] + " " * (len(m.group(0)) - 2) + m.group(0)[-1], sql)
+
+
+def _select_principal(sql):
+    """Posição do SELECT final de um WITH ... SELECT (fora dos parênteses das CTEs), ou None."""
+    profundidade = 0
+    for token in _SELECT_OU_PARENTESES.finditer(_sem_literais(sql)):
+        if token.group(0) == "(":
+            profundidade += 1
+        elif token.group(0) == ")":
+            profundidade -= 1
+        elif profundidade == 0:
+            return token.start()
+    return None
+
+
+def sanitizar(sql):
+    """
+    Limpa o SQL gerado (cercas de markdown, comentários, ';' final) e recusa
+    o que não for um único SELECT (ou WITH ... SELECT) sem comandos de escrita.
+    """
+    sql = _CERCA.sub("", sql or "")
+    sql = _COMENTARIOS.sub(" ", sql).strip().rstrip(";").strip()
+    if not sql:
+        raise ConsultaRecusada("consulta vazia")
+
+    sem_literais = _sem_literais(sql)
+    if ";" in sem_literais:
+        raise ConsultaRecusada("mais de um comando na consulta")
+    if not _INICIO.match(sem_literais):
+        raise ConsultaRecusada("somente consultas SELECT são permitidas")
+    proibida = _PROIBIDAS.search(sem_literais)
+    if proibida:
+        raise ConsultaRecusada(f"comando não permitido: {proibida.group(0).upper()}")
+    return sql
+
+
+def limitar_linhas(sql, dialeto, max_linhas=GUARDA_MAX_LINHAS):
+    """
+    Garante o limite de linhas: TOP no SQL Server, LIMIT nos demais. Um
+    limite menor já presente na consulta é mantido. Em WITH ... SELECT no
+    SQL Server o TOP vai no SELECT final, depois das CTEs.
+    """
+    if dialeto == "mssql":
+        inicio = _select_principal(sql) if _WITH.match(sql) else 0
+        if inicio is None:
+            raise ConsultaRecusada("WITH sem SELECT final")
+        cabeca, sql = sql[:inicio], sql[inicio:]
+        topo = _TOP.match(sql)
+        if not topo:
+            raise ConsultaRecusada("somente consultas SELECT são permitidas")
+        atual = topo.group(2)
+        if atual is not None and "PERCENT" not in topo.group(0).upper() and int(atual) <= max_linhas:
+            return cabeca + sql
+        return f"{cabeca}{topo.group(1)}TOP {max_linhas} {sql[topo.end():]}"
+
+    limite = _LIMIT.search(sql)
+    if limite is None:
+        return f"{sql} LIMIT {max_linhas}"
+    if int(limite.group(1)) <= max_linhas:
+        return sql
+    return f"{sql[:limite.start()]}LIMIT {max_linhas}{limite.group(2) or ''}"
+
+
+def projetar_colunas(sql, preparer):
+    """Troca "SELECT * FROM dous" pela lista de colunas sem os textos longos."""
+    colunas = ", ".join(
+        preparer.quote(coluna.name) for coluna in dous_table.columns if coluna.name not in COLUNAS_TEXTO_LONGO
+    )
+    return _ESTRELA.sub(lambda m: f"{m.group(1)}{colunas}{m.group(2)}", sql, count=1)
+
+
+def _cortar(valor, max_caracteres):
+    if isinstance(valor, str) and len(valor) > max_caracteres:
+        return valor[:max_caracteres] + "..."
+    return valor
+
+
+# Estimadores de custo por dialeto: função (conn, sql) -> custo ou None
+_estimadores = {}
+
+
+def registrar_estimador(dialeto, estimador):
+    """Registra a função que estima o custo de uma consulta no dialeto."""
+    _estimadores[dialeto] = estimador
+
+
+def estimar_custo(conn, sql):
+    """Custo estimado pelo otimizador, ou None se o dialeto não tem estimador."""
+    estimador = _estimadores.get(conn.dialect.name)
+    if estimador is None:
+        return None
+    try:
+        return estimador(conn, sql)
+    except Exception as e:
+        logger.warning("Falha ao estimar o custo da consulta: %s", e)
+        return None
+
+
+def _custo_mssql(conn, sql):
+    # StatementSubTreeCost do plano estimado (a consulta não é executada)
+    conn.exec_driver_sql("SET SHOWPLAN_XML ON")
+    try:
+        plano = conn.exec_driver_sql(sql).scalar()
+    finally:
+        conn.exec_driver_sql("SET SHOWPLAN_XML OFF")
+    custos = [
+        float(no.get("StatementSubTreeCost"))
+        for no in ET.fromstring(plano).iter()
+        if no.get("StatementSubTreeCost") is not None
+    ]
+    return max(custos) if custos else None
+
+
+def _custo_sqlite(conn, sql):
+    # Sem custo numérico no SQLite: conta as varreduras completas de tabela
+    plano = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}").fetchall()
+    return float(sum(1 for linha in plano if str(linha[-1]).startswith("SCAN")))
+
+
+registrar_estimador("mssql", _custo_mssql)
+registrar_estimador("sqlite", _custo_sqlite)
+
+
+def preparar(sql, dialect, max_linhas=GUARDA_MAX_LINHAS):
+    """SQL validado, com limite de linhas e sem as colunas de texto longo."""
+    sql = sanitizar(sql)
+    sql = projetar_colunas(sql, dialect.identifier_preparer)
+    return limitar_linhas(sql, dialect.name, max_linhas)
+
+
+def executar_consulta_guardada(sql, max_linhas=GUARDA_MAX_LINHAS, timeout=GUARDA_TIMEOUT,
+                               max_caracteres=GUARDA_MAX_CARACTERES, custo_maximo=GUARDA_CUSTO_MAXIMO):
+    """
+    Executa o SQL gerado pela LLM com as proteções do guarda: só leitura,
+    no máximo `max_linhas` linhas, `timeout` segundos e textos cortados em
+    `max_caracteres`. Retorna (colunas, linhas, origem), com a origem do cache
+    de resultados; levanta ConsultaRecusada.
+    """
+    engine = get_engine()
+    try:
+        sql = preparar(sql, engine.dialect, max_linhas)
+    except ConsultaRecusada as e:
+        registry.inc("dous_sql_recusadas_total", motivo="regra")
+        logger.warning("SQL recusado (%s): %s", e, sql)
+        raise
+
+    def _executar():
+        with engine.connect() as conn:
+            conn = conn.execution_options(statement_timeout=timeout)
+            if custo_maximo is not None:
+                custo = estimar_custo(conn, sql)
+                if custo is not None and custo > custo_maximo:
+                    registry.inc("dous_sql_recusadas_total", motivo="custo")
+                    raise ConsultaRecusada(f"custo estimado {custo:g} acima do limite {custo_maximo:g}")
+
+            logger.debug("Executando SQL guardado: %s", sql)
+            # exec_driver_sql: o texto vai direto ao driver (":" em literais não
+            # vira parâmetro)
+            result = conn.exec_driver_sql(sql)
+            colunas = list(result.keys())
+            valores = [tuple(_cortar(valor, max_caracteres) for valor in linha) for linha in result.fetchmany(max_linhas)]
+            result.close()
+        return colunas, make_rows(colunas, valores)
+
+    chave = ("guarda", normalize_sql(sql), max_linhas, max_caracteres)
+    (colunas, linhas), origem = cached_result(chave, _executar)
+    return colunas, linhas, origem
@@ -0,0 +1,460 @@
+import argparse
+import hashlib
+import os
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+from sqlalchemy import BigInteger, Column, DateTime, Float, String, Table, func, inspect, select, text
+
+from busca import clear_index, index_available, index_dataframe, remove_from_index
+from loader import (
+    DEFAULT_CHUNK_SIZE, DOUS_COLUMNS, LOADERS, bump_data_version, dous_table, key_clause, load_dataframe, metadata,
+    read_data_version, record_index_version,
+)
+
+# Atributos da tag <article> na ordem em que aparecem no XML do DOU
+ARTICLE_FIELDS = [
+    "id", "name", "idOficio", "pubName", "artType", "pubDate", "artClass",
+    "artCategory", "artSize", "artNotes", "numberPage", "pdfPage", "editionNumber",
+    "highlightType", "highlightPriority", "highlight", "highlightimage",
+    "highlightimagename", "idMateria",
+]
+
+# Campos dentro de <body>
+BODY_FIELDS = ["Identifica", "Data", "Ementa", "Titulo", "SubTitulo", "Texto"]
+
+COLUMNS = DOUS_COLUMNS
+
+# Chave de upsert das linhas da tabela dous
+KEY_COLUMNS = ["id", "idMateria"]
+ID_POS = COLUMNS.index("id")
+ID_MATERIA_POS = COLUMNS.index("idMateria")
+
+INT_COLUMNS = {column.name for column in dous_table.columns if isinstance(column.type, BigInteger)}
+FLOAT_COLUMNS = {column.name for column in dous_table.columns if isinstance(column.type, Float)}
+
+
+def _to_int(value):
+    if not value:
+        return 0
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return int(float(value))
+        except ValueError:
+            return 0
+
+
+def _to_float(value):
+    if not value:
+        return 0.0
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def _typed(column, value):
+    if column in INT_COLUMNS:
+        return _to_int(value)
+    if column in FLOAT_COLUMNS:
+        return _to_float(value)
+    return value if value is not None else ""
+
+
+def iter_articles(xml_file):
+    """
+    Lê o XML em modo streaming e gera um dicionário por <article>,
+    já com os campos de <body> e os tipos convertidos.
+    """
+    for _, elem in ET.iterparse(xml_file, events=("end",)):
+        if elem.tag != "article":
+            continue
+
+        record = {key: _typed(key, elem.get(key)) for key in ARTICLE_FIELDS}
+        record["body"] = ""
+
+        midias = elem.find("Midias")
+        record["Midias"] = _to_float(midias.text.strip() if midias is not None and midias.text else "")
+
+        body_tag = elem.find("body")
+        for key in BODY_FIELDS:
+            element = body_tag.find(key) if body_tag is not None else None
+            record[key] = element.text.strip() if element is not None and element.text else ""
+
+        elem.clear()
+        yield record
+
+
+def parse_file(xml_file):
+    """
+    Faz o parse de um arquivo XML uma única vez e retorna as linhas (tuplas na
+    ordem de COLUMNS), sem duplicatas.
+    """
+    rows = []
+    seen = set()
+    for record in iter_articles(xml_file):
+        row = tuple(record[col] for col in COLUMNS)
+        if row not in seen:
+            seen.add(row)
+            rows.append(row)
+    return rows
+
+
+def list_xml_files(path_folder):
+    """Lista os arquivos .xml de uma pasta, em ordem."""
+    return sorted(
+        os.path.join(path_folder, file)
+        for file in os.listdir(path_folder)
+        if file.endswith(".xml")
+    )
+
+
+def rows_to_dataframe(rows):
+    """Monta um DataFrame tipado a partir das linhas produzidas por parse_file."""
+    df = pd.DataFrame.from_records(rows, columns=COLUMNS)
+    for col in INT_COLUMNS:
+        df[col] = df[col].astype("int64")
+    for col in FLOAT_COLUMNS:
+        df[col] = df[col].astype("float64")
+    return df
+
+
+class IngestStats:
+    """Contadores de vazão da ingestão."""
+
+    def __init__(self):
+        self.files = 0
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    @property
+    def elapsed(self):
+        return time.perf_counter() - self.started
+
+    @property
+    def files_per_s(self):
+        return self.files / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def rows_per_s(self):
+        return self.rows / self.elapsed if self.elapsed else 0.0
+
+    def __str__(self):
+        return (
+            f"{self.files} arquivos, {self.rows} linhas em {self.elapsed:.1f}s "
+            f"({self.files_per_s:.1f} arquivos/s, {self.rows_per_s:.1f} linhas/s)"
+        )
+
+
+def iter_batches(files, batch_rows=50000, workers=None, stats=None, keys=None):
+    """
+    Distribui os arquivos entre um pool de processos e gera DataFrames tipados
+    com até `batch_rows` linhas, prontos para o carregador.
+
+    Com workers=1 o parse roda no próprio processo. Se `keys` for um
+    dicionário, recebe {arquivo: conjunto de chaves (id, idMateria)}.
+    """
+    stats = stats if stats is not None else IngestStats()
+    workers = workers or os.cpu_count() or 1
+    pending = []
+
+    def _consume(results):
+        nonlocal pending
+        # map preserva a ordem dos arquivos
+        for path, rows in zip(files, results):
+            if keys is not None:
+                keys[path] = {(row[ID_POS], row[ID_MATERIA_POS]) for row in rows}
+            stats.files += 1
+            stats.rows += len(rows)
+            pending.extend(rows)
+            if len(pending) >= batch_rows:
+                batch, pending = pending, []
+                yield rows_to_dataframe(batch)
+
+    if workers == 1:
+        yield from _consume(map(parse_file, files))
+    else:
+        chunksize = max(1, len(files) // (workers * 8))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from _consume(executor.map(parse_file, files, chunksize=chunksize))
+
+    if pending:
+        yield rows_to_dataframe(pending)
+
+
+# Manifesto dos arquivos já ingeridos
+manifest_table = Table(
+    "dous_arquivos",
+    metadata,
+    Column("path", String(500), primary_key=True),
+    Column("size", BigInteger, nullable=False),
+    Column("mtime", Float, nullable=False),
+    Column("sha256", String(64), nullable=False),
+    Column("ingested_at", DateTime, nullable=False, server_default=func.now()),
+)
+
+# Chaves (id, idMateria) vindas de cada arquivo do manifesto, para apagar as
+# linhas que somem de um arquivo alterado
+file_keys_table = Table(
+    "dous_arquivos_chaves",
+    metadata,
+    Column("path", String(500), primary_key=True),
+    Column("id", BigInteger, primary_key=True, autoincrement=False),
+    Column("idMateria", BigInteger, primary_key=True, autoincrement=False),
+)
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    """Calcula o hash SHA-256 do conteúdo de um arquivo."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _manifest_key(path):
+    return os.path.normpath(path).replace("\\", "/")
+
+
+def load_manifest(engine):
+    """Retorna {path: (size, mtime, sha256)} dos arquivos já ingeridos."""
+    metadata.create_all(engine, tables=[manifest_table, file_keys_table])
+    with engine.connect() as conn:
+        rows = conn.execute(select(manifest_table.c.path, manifest_table.c.size, manifest_table.c.mtime, manifest_table.c.sha256))
+        return {row.path: (row.size, row.mtime, row.sha256) for row in rows}
+
+
+def select_changed_files(engine, files):
+    """
+    Compara os arquivos com o manifesto e retorna (alterados, inalterados).
+
+    Tamanho e mtime iguais bastam para pular o arquivo; quando diferem o hash
+    do conteúdo decide, de modo que um arquivo apenas "tocado" não é reprocessado.
+    Cada item é um dicionário pronto para record_manifest.
+    """
+    manifest = load_manifest(engine)
+    changed, unchanged = [], []
+    for path in files:
+        st = os.stat(path)
+        entry = {"file": path, "path": _manifest_key(path), "size": st.st_size, "mtime": st.st_mtime}
+        known = manifest.get(entry["path"])
+        if known and known[0] == st.st_size and known[1] == st.st_mtime:
+            unchanged.append(entry)
+            continue
+        entry["sha256"] = file_sha256(path)
+        if known and known[0] == st.st_size and known[2] == entry["sha256"]:
+            # Conteúdo idêntico: só o mtime do manifesto precisa ser atualizado
+            unchanged.append(entry)
+        else:
+            changed.append(entry)
+    return changed, unchanged
+
+
+def record_manifest(engine, entries):
+    """Grava (ou atualiza) as entradas do manifesto."""
+    if not entries:
+        return
+    paths = [entry["path"] for entry in entries]
+    with engine.begin() as conn:
+        for start in range(0, len(paths), 1000):
+            conn.execute(manifest_table.delete().where(manifest_table.c.path.in_(paths[start:start + 1000])))
+        conn.execute(manifest_table.insert(), [
+            {"path": e["path"], "size": e["size"], "mtime": e["mtime"], "sha256": e["sha256"]}
+            for e in entries
+        ])
+
+
+# Pares por comando: 2 parâmetros cada, abaixo do limite de 2100 do SQL Server
+PAIRS_PER_STATEMENT = 1000
+
+
+def delete_keys(conn, pairs):
+    """Apaga da tabela dous as linhas com as chaves (id, idMateria) dadas."""
+    pairs = [(int(id_), int(materia)) for id_, materia in pairs]
+    for start in range(0, len(pairs), PAIRS_PER_STATEMENT):
+        conn.execute(dous_table.delete().where(key_clause(conn.dialect, pairs[start:start + PAIRS_PER_STATEMENT])))
+
+
+def upsert_batch(engine, df, method="executemany", chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Insere o lote substituindo as linhas já existentes com a mesma chave
+    (id, idMateria), numa única transação.
+    """
+    df = df.drop_duplicates(subset=KEY_COLUMNS, keep="last")
+    with engine.begin() as conn:
+        if inspect(conn).has_table(dous_table.name):
+            delete_keys(conn, df[KEY_COLUMNS].itertuples(index=False, name=None))
+        load_dataframe(conn, df, method=method, chunk_size=chunk_size)
+
+
+def replace_file_keys(engine, keys):
+    """
+    Grava as chaves de cada arquivo alterado e apaga da tabela dous as que
+    saíram do arquivo e não vêm de nenhum outro. Retorna os pares apagados.
+    """
+    if not keys:
+        return []
+    paths = {path: _manifest_key(path) for path in keys}
+    stale = set()
+    with engine.begin() as conn:
+        for path, new_keys in keys.items():
+            old_keys = {
+                (row.id, row.idMateria)
+                for row in conn.execute(
+                    select(file_keys_table.c.id, file_keys_table.c.idMateria).where(file_keys_table.c.path == paths[path])
+                )
+            }
+            stale |= old_keys - new_keys
+            conn.execute(file_keys_table.delete().where(file_keys_table.c.path == paths[path]))
+            if new_keys:
+                conn.execute(file_keys_table.insert(), [
+                    {"path": paths[path], "id": int(id_), "idMateria": int(materia)} for id_, materia in new_keys
+                ])
+
+        # Chaves que continuam em outro arquivo ficam
+        stale = sorted(stale)
+        kept = set()
+        for start in range(0, len(stale), PAIRS_PER_STATEMENT):
+            clause = key_clause(conn.dialect, stale[start:start + PAIRS_PER_STATEMENT], file_keys_table)
+            kept.update(
+                (row.id, row.idMateria)
+                for row in conn.execute(select(file_keys_table.c.id, file_keys_table.c.idMateria).where(clause).distinct())
+            )
+        removed = [pair for pair in stale if pair not in kept]
+        if removed and inspect(conn).has_table(dous_table.name):
+            delete_keys(conn, removed)
+    return removed
+
+
+def _dous_empty(engine):
+    with engine.connect() as conn:
+        if not inspect(conn).has_table(dous_table.name):
+            return True
+        return conn.execute(select(dous_table.c.id).limit(1)).first() is None
+
+
+def ingest_folder(engine, path_folder, incremental=True, workers=None, batch_rows=50000,
+                  method="executemany", chunk_size=DEFAULT_CHUNK_SIZE, build_index=True):
+    """
+    Ingere os XMLs de uma pasta na tabela dous.
+
+    No modo incremental apenas arquivos novos ou alterados são lidos e suas
+    linhas são atualizadas por chave; no modo completo a tabela é recriada.
+    Com build_index o índice de texto completo (busca.py) é mantido junto, e
+    a versão que ele cobre só é registrada se ele já estava em dia (ou foi
+    reconstruído na carga completa).
+    """
+    files = list_xml_files(path_folder)
+    index_complete = build_index and (not incremental or index_available(engine))
+    if build_index and incremental and not index_complete and _dous_empty(engine):
+        # Primeira carga: o índice é construído junto, do zero
+        clear_index()
+        index_complete = True
+
+    if incremental:
+        changed, unchanged = select_changed_files(engine, files)
+        print(f"Arquivos alterados: {len(changed)} | inalterados: {len(unchanged)}")
+        record_manifest(engine, [entry for entry in unchanged if "sha256" in entry])
+    else:
+        metadata.create_all(engine, tables=[manifest_table, file_keys_table])
+        with engine.begin() as conn:
+            if inspect(conn).has_table("dous"):
+                conn.execute(text("DELETE FROM dous"))
+            conn.execute(manifest_table.delete())
+            conn.execute(file_keys_table.delete())
+        if build_index:
+            clear_index()
+        changed = [
+            {"file": path, "path": _manifest_key(path), "size": os.stat(path).st_size,
+             "mtime": os.stat(path).st_mtime, "sha256": file_sha256(path)}
+            for path in files
+        ]
+
+    stats = IngestStats()
+    if changed:
+        paths = [entry["file"] for entry in changed]
+        keys = {}
+        # Inserção em lotes para evitar sobrecarga de memória
+        for batch_df in iter_batches(paths, batch_rows=batch_rows, workers=workers, stats=stats, keys=keys):
+            upsert_batch(engine, batch_df, method=method, chunk_size=chunk_size)
+            if build_index:
+                index_dataframe(batch_df)
+            print(f"📦 {stats}")
+        removed = replace_file_keys(engine, keys)
+        if removed:
+            if build_index:
+                remove_from_index(removed)
+            print(f"🗑️ {len(removed)} linhas removidas dos arquivos alterados")
+        record_manifest(engine, changed)
+
+    if changed or not incremental:
+        with engine.begin() as conn:
+            versao = bump_data_version(conn)
+            if index_complete:
+                record_index_version(conn, versao)
+        print(f"Versão dos dados: {versao}")
+    if build_index and not index_complete:
+        print("⚠️ Índice de texto desatualizado; rode 'python ingest.py --reindexar'")
+
+    print(f"✅ Ingestão concluída: {stats}")
+    return stats
+
+
+def reindex_from_db(engine, batch_rows=50000):
+    """
+    Reconstrói o índice de texto completo a partir da tabela dous e registra
+    a versão dos dados que ele cobre.
+    """
+    with engine.connect() as conn:
+        versao = read_data_version(conn)
+    clear_index()
+    columns = [dous_table.c[col] for col in ("id", "Identifica", "Ementa", "Texto", "idMateria", "artType", "artCategory", "pubDate")]
+    total = 0
+    for batch_df in pd.read_sql(select(*columns), engine, chunksize=batch_rows):
+        index_dataframe(batch_df)
+        total += len(batch_df)
+        print(f"🔎 {total} linhas indexadas")
+    with engine.begin() as conn:
+        record_index_version(conn, versao)
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingestão dos XMLs do DOU na tabela dous.")
+    parser.add_argument("pasta", nargs="?", default="./dados/S01052024", help="Pasta com os arquivos .xml")
+    parser.add_argument("--completa", action="store_true", help="Recria a tabela do zero em vez de carregar só os arquivos alterados")
+    parser.add_argument("--workers", type=int, default=None, help="Processos de parse (padrão: número de CPUs)")
+    parser.add_argument("--batch-rows", type=int, default=50000, help="Linhas por lote enviado ao banco")
+    parser.add_argument("--method", default="executemany", choices=list(LOADERS), help="Método de carga")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Linhas por comando de INSERT")
+    parser.add_argument("--sem-indice", action="store_true", help="Não atualiza o índice de texto completo")
+    parser.add_argument("--reindexar", action="store_true", help="Apenas reconstrói o índice de texto completo a partir do banco")
+    parser.add_argument("--db-url", default=None, help="URL do banco (padrão: DOUS_DB_URL ou o SQL Server)")
+    args = parser.parse_args()
+
+    from send import create_db_engine
+
+    engine = create_db_engine(args.db_url)
+    if args.reindexar:
+        reindex_from_db(engine, batch_rows=args.batch_rows)
+        return
+
+    ingest_folder(
+        engine,
+        args.pasta,
+        incremental=not args.completa,
+        workers=args.workers,
+        batch_rows=args.batch_rows,
+        method=args.method,
+        chunk_size=args.chunk_size,
+        build_index=not args.sem_indice,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+import logging
+import os
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# Pool limitado: extrações concorrentes não competem com as requisições web
+JOB_WORKERS = int(os.environ.get("DOUS_JOB_WORKERS", "2"))
+JOB_OUTPUT_DIR = os.environ.get("DOUS_JOB_OUTPUT_DIR", "./jobs")
+# Quantos jobs finalizados manter em memória
+JOB_HISTORY = int(os.environ.get("DOUS_JOB_HISTORY", "100"))
+
+PENDING = "pendente"
+RUNNING = "executando"
+DONE = "concluido"
+FAILED = "erro"
+CANCELLED = "cancelado"
+
+FINISHED = {DONE, FAILED, CANCELLED}
+
+
+class Job:
+    """Estado de uma extração executada em segundo plano."""
+
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.status = PENDING
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = {"processadas": 0, "total": None, "tabelas": 0, "erros": 0}
+        self.timings = {}
+        self.message = None
+        self.error = None
+        self.artifacts = {}
+        self.output_dir = os.path.join(JOB_OUTPUT_DIR, self.id)
+        self.cancel_event = threading.Event()
+        self.future = None
+        # Progresso e tempos são escritos pela thread do job e lidos pelas
+        # requisições de status
+        self._lock = threading.Lock()
+
+    def update_progress(self, processadas, total, tabelas, erros, timings=None):
+        """Atualiza o progresso; `timings` (se dado) é copiado na mesma trava."""
+        with self._lock:
+            self.progress = {"processadas": processadas, "total": total, "tabelas": tabelas, "erros": erros}
+            if timings is not None:
+                self.timings = dict(timings)
+
+    def set_timings(self, timings):
+        with self._lock:
+            self.timings = dict(timings)
+
+    def to_dict(self):
+        with self._lock:
+            progress = dict(self.progress)
+            timings = dict(self.timings)
+        return {
+            "job_id": self.id,
+            "tipo": self.kind,
+            "status": self.status,
+            "criado_em": self.created_at,
+            "iniciado_em": self.started_at,
+            "finalizado_em": self.finished_at,
+            "progresso": progress,
+            "tempos": {stage: round(seconds, 3) for stage, seconds in timings.items()},
+            "mensagem": self.message,
+            "erro": self.error,
+            "arquivos": sorted(self.artifacts),
+        }
+
+
+class JobManager:
+    """Executa jobs num pool de threads de tamanho fixo e guarda seu estado."""
+
+    def __init__(self, max_workers=JOB_WORKERS):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, kind, fn):
+        """
+        Agenda `fn(job)` e retorna o Job. A função deve atualizar o progresso
+        do job e retornar um dicionário com "message", "artifacts" e "timings".
+        """
+        job = Job(kind)
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+        job.future = self._executor.submit(self._run, job, fn)
+        return job
+
+    def _run(self, job, fn):
+        if job.cancel_event.is_set():
+            # Cancelado depois de sair da fila, antes de começar
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            return
+        job.status = RUNNING
+        job.started_at = time.time()
+        os.makedirs(job.output_dir, exist_ok=True)
+        try:
+            result = fn(job)
+            job.message = result.get("message")
+            job.artifacts = result.get("artifacts", {})
+            if "timings" in result:
+                job.set_timings(result["timings"])
+            job.status = DONE
+        except Exception as e:
+            if job.cancel_event.is_set():
+                job.status = CANCELLED
+                job.message = str(e)
+            else:
+                job.status = FAILED
+                job.error = str(e)
+                logger.exception("Erro no job %s (%s)", job.id, job.kind)
+        finally:
+            job.finished_at = time.time()
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id):
+        """Sinaliza o cancelamento; jobs ainda na fila nem chegam a rodar."""
+        job = self.get(job_id)
+        if job is None or job.status in FINISHED:
+            return job
+        job.cancel_event.set()
+        if job.future is not None and job.future.cancel():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+        return job
+
+    def _prune(self):
+        """Esquece os jobs finalizados mais antigos e apaga os arquivos deles."""
+        finished = [job for job in self._jobs.values() if job.status in FINISHED]
+        for job in sorted(finished, key=lambda j: j.finished_at or 0)[:max(0, len(finished) - JOB_HISTORY)]:
+            del self._jobs[job.id]
+            shutil.rmtree(job.output_dir, ignore_errors=True)
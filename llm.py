@@ -1,23 +1,32 @@
-from dataclasses import Field
-from dotenv import load_dotenv
 from langchain.schema.runnable import RunnablePassthrough
 from langchain.llms import BaseLLM
-import requests
 from langchain.schema import LLMResult
-import json
+import logging
 from langchain.prompts import PromptTemplate
-from huggingface_hub import login
-import os
-import huggingface_hub
+import threading
 
-from transformers import TapasTokenizer, TapasForQuestionAnswering
 import pandas as pd
 
-tokenizer = TapasTokenizer.from_pretrained("google/tapas-large-finetuned-wtq")
-model = TapasForQuestionAnswering.from_pretrained("google/tapas-large-finetuned-wtq")
+from cliente_llm import LLMError, client
 
+TAPAS_MODEL = "google/tapas-large-finetuned-wtq"
+_tapas = None
+_tapas_lock = threading.Lock()
 
-LM_STUDIO_URL = "http://10.2.3.63:1234/v1/completions"
+
+def get_tapas():
+    """(tokenizer, modelo) do TAPAS, baixados/carregados só no primeiro uso."""
+    global _tapas
+    if _tapas is None:
+        with _tapas_lock:
+            if _tapas is None:
+                from transformers import TapasForQuestionAnswering, TapasTokenizer
+                _tapas = (TapasTokenizer.from_pretrained(TAPAS_MODEL),
+                          TapasForQuestionAnswering.from_pretrained(TAPAS_MODEL))
+    return _tapas
+
+
+logger = logging.getLogger(__name__)
 
 class LocalLLM(BaseLLM):
     model_name: str
@@ -26,33 +35,19 @@ class LocalLLM(BaseLLM):
         super().__init__(model_name=model_name, **kwargs)  
         self.model_name = model_name
 
+    @staticmethod
+    def _clean(text_output):
+        if "```sql" in text_output:
+            text_output = text_output.split("```sql")[-1].split("```")[0].strip()
+        return text_output
+
     def _call(self, prompt: str, stop=None) -> str:
-        headers = {"Content-Type": "application/json"}
-        payload = {
-            "model": self.model_name,
-            "prompt": prompt,
-            "max_tokens": 131072,
-            "temperature": 0.0,
-            "top_p": 0.7 #regula quais palavras são consideradas para geração, escolhendo as mais prováveis onde a soma das probabilidades seja ate no max 0.7 por exemplo
-        }
-        try:
-            response = requests.post(LM_STUDIO_URL, headers=headers, json=payload)
-            response.raise_for_status()
-            text_output = response.json().get('choices', [{}])[0].get('text', '').strip()
-
-            if "```sql" in text_output:
-                text_output = text_output.split("```sql")[-1].split("```")[0].strip()
-
-            return text_output
-        except requests.RequestException as e:
-            raise Exception(f"Erro ao conectar à API do LM Studio: {e}")
+        return self._clean(client.complete(prompt, self.model_name, stop))
 
     def _generate(self, prompts, stop=None):
-        results = []
-        for prompt in prompts:
-            text = self._call(prompt)
-            results.append({"text": text})
-        return LLMResult(generations=[[result] for result in results])
+        # Os prompts do lote vão em paralelo pelo cliente compartilhado
+        texts = client.complete_many(prompts, self.model_name, stop)
+        return LLMResult(generations=[[{"text": self._clean(text)}] for text in texts])
 
     @property
     def _llm_type(self):
@@ -84,7 +79,7 @@ prompt_format_response = PromptTemplate(
     input_variables=["question", "raw_response"],
     template=(
         "O usuário perguntou: {question}\n"
-        "O banco de dados respondeu com: {raw_response}\n"
+        "O banco de dados respondeu com (resumo e primeiras linhas):\n{raw_response}\n"
         "Formule uma resposta clara e objetiva para o usuário com base nesses dados."
     )
 )
@@ -92,10 +87,12 @@ response_chain = RunnablePassthrough() | prompt_format_response | llm_local
 
 def format_response(question, raw_response):
     response = response_chain.invoke({"question": question, "raw_response": raw_response})
+    return response
 
-import pandas as pd
-import os
-import requests
+def stream_format_response(question, raw_response):
+    """Como format_response, mas gera a resposta em pedaços conforme o modelo escreve."""
+    prompt = prompt_format_response.format(question=question, raw_response=raw_response)
+    return client.stream(prompt, llm_local.model_name)
 
 def extract_table_using_llm(texto_portaria):
     """
@@ -111,26 +108,15 @@ def extract_table_using_llm(texto_portaria):
     Use ";" como separador.
     """
 
-    headers = {"Content-Type": "application/json"}
-    payload = {
-        "model": "gemma-3-12b-it",
-        "prompt": prompt,
-        "max_tokens":131072,
-        "temperature": 0.0,
-        "top_p": 0.7
-    }
-
     try:
-        response = requests.post("http://10.2.3.63:1234/v1/completions", headers=headers, json=payload)
-        response.raise_for_status()
-        csv_output = response.json().get('choices', [{}])[0].get('text', '').strip()
+        csv_output = client.complete(prompt, "gemma-3-12b-it")
         
         # Converter CSV em DataFrame
         from io import StringIO
         df = pd.read_csv(StringIO(csv_output), delimiter=";")
         return df
-    except requests.RequestException as e:
-        print(f"Erro ao conectar ao LLM para extração de tabela: {e}")
+    except LLMError as e:
+        logger.warning("Erro ao conectar ao LLM para extração de tabela: %s", e)
         return None
 
 
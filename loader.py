@@ -0,0 +1,203 @@
+from sqlalchemy import BigInteger, Column, DateTime, Float, Integer, MetaData, String, Table, and_, func, inspect, or_, select, tuple_
+
+metadata = MetaData()
+
+# Esquema da tabela dous, definido uma única vez
+dous_table = Table(
+    "dous",
+    metadata,
+    Column("id", BigInteger),
+    Column("name", String(255)),
+    Column("idOficio", BigInteger),
+    Column("pubName", String(50)),
+    Column("artType", String(255)),
+    Column("pubDate", String(50)),
+    Column("artClass", String(255)),
+    Column("artCategory", String(500)),
+    Column("artSize", BigInteger),
+    Column("artNotes", Float),
+    Column("numberPage", BigInteger),
+    Column("pdfPage", String(500)),
+    Column("editionNumber", String()),
+    Column("highlightType", Float),
+    Column("highlightPriority", Float),
+    Column("highlight", Float),
+    Column("highlightimage", Float),
+    Column("highlightimagename", Float),
+    Column("idMateria", BigInteger),
+    Column("body", String()),
+    Column("Midias", Float),
+    Column("Identifica", String(2000)),
+    Column("Data", String(255)),
+    Column("Ementa", String(2000)),
+    Column("Titulo", String(1000)),
+    Column("SubTitulo", String(1000)),
+    Column("Texto", String()),
+)
+
+# Versão dos dados: incrementada a cada ingestão que altera a tabela dous,
+# usada para invalidar caches de resultados
+versao_table = Table(
+    "dous_versao",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("versao", BigInteger, nullable=False),
+    Column("atualizado_em", DateTime, nullable=False, server_default=func.now(), onupdate=func.now()),
+)
+
+# Versão dos dados coberta pelo índice de texto completo (busca.py): o índice
+# só substitui a varredura quando é igual à versão de dous_versao
+versao_indice_table = Table(
+    "dous_versao_indice",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("versao", BigInteger, nullable=False),
+    Column("atualizado_em", DateTime, nullable=False, server_default=func.now(), onupdate=func.now()),
+)
+
+DOUS_COLUMNS = [column.name for column in dous_table.columns]
+
+# Tipos para DataFrame.to_sql (mantido para o carregador "to_sql")
+DOUS_DTYPE = {column.name: column.type for column in dous_table.columns}
+
+# O SQL Server aceita no máximo 2100 parâmetros por comando
+MAX_PARAMS = {"mssql": 2100, "sqlite": 32766}
+
+DEFAULT_CHUNK_SIZE = 10000
+
+
+def engine_options(url):
+    """
+    Opções de create_engine para o carregamento em massa: no SQL Server via
+    pyodbc ativa o fast_executemany, que envia o lote inteiro de parâmetros
+    de uma vez em vez de uma ida ao servidor por linha.
+    """
+    if str(url).startswith("mssql+pyodbc"):
+        return {"fast_executemany": True}
+    return {}
+
+
+def _rows(df):
+    # itertuples já devolve tipos nativos do Python (int/float/str)
+    return list(df[DOUS_COLUMNS].itertuples(index=False, name=None))
+
+
+def _placeholders(conn, count, offset=0):
+    style = conn.dialect.paramstyle
+    if style == "qmark":
+        return ["?"] * count
+    if style in ("format", "pyformat"):
+        return ["%s"] * count
+    if style == "numeric":
+        return [f":{offset + i + 1}" for i in range(count)]
+    raise ValueError(f"paramstyle não suportado pelo carregador: {style}")
+
+
+def _insert_sql(conn, rows_per_statement):
+    preparer = conn.dialect.identifier_preparer
+    columns = ", ".join(preparer.quote(col) for col in DOUS_COLUMNS)
+    width = len(DOUS_COLUMNS)
+    values = ", ".join(
+        "(" + ", ".join(_placeholders(conn, width, offset=i * width)) + ")"
+        for i in range(rows_per_statement)
+    )
+    return f"INSERT INTO {preparer.quote(dous_table.name)} ({columns}) VALUES {values}"
+
+
+def _load_executemany(conn, df, chunk_size):
+    # Vai direto ao cursor do driver: sem compilar o INSERT a cada lote nem
+    # converter as linhas em dicionários
+    rows = _rows(df)
+    sql = _insert_sql(conn, 1)
+    for start in range(0, len(rows), chunk_size):
+        conn.exec_driver_sql(sql, rows[start:start + chunk_size])
+
+
+def _load_multi(conn, df, chunk_size):
+    # INSERT ... VALUES (...), (...): limitado pelo número de parâmetros do banco
+    max_params = MAX_PARAMS.get(conn.dialect.name, 2100)
+    rows_per_statement = max(1, min(chunk_size, 1000, (max_params - 1) // len(DOUS_COLUMNS)))
+    rows = _rows(df)
+    full_sql = _insert_sql(conn, rows_per_statement)
+    for start in range(0, len(rows), rows_per_statement):
+        chunk = rows[start:start + rows_per_statement]
+        sql = full_sql if len(chunk) == rows_per_statement else _insert_sql(conn, len(chunk))
+        conn.exec_driver_sql(sql, tuple(value for row in chunk for value in row))
+
+
+def _load_to_sql(conn, df, chunk_size):
+    df[DOUS_COLUMNS].to_sql(
+        dous_table.name, conn, if_exists="append", index=False,
+        dtype=DOUS_DTYPE, chunksize=chunk_size,
+    )
+
+
+LOADERS = {
+    "executemany": _load_executemany,
+    "multi": _load_multi,
+    "to_sql": _load_to_sql,
+}
+
+
+def load_dataframe(conn, df, method="executemany", chunk_size=DEFAULT_CHUNK_SIZE):
+    """
+    Carrega um DataFrame na tabela dous usando o método escolhido:
+
+    - "executemany": um INSERT parametrizado com o lote inteiro de linhas
+      (usa fast_executemany no SQL Server; ver engine_options);
+    - "multi": INSERTs com várias linhas em VALUES;
+    - "to_sql": o DataFrame.to_sql do pandas, para comparação.
+
+    `conn` deve ser uma conexão dentro de uma transação (engine.begin()).
+    """
+    if method not in LOADERS:
+        raise ValueError(f"Método de carga desconhecido: {method}. Opções: {', '.join(LOADERS)}")
+    if df.empty:
+        return 0
+    metadata.create_all(conn, tables=[dous_table])
+    LOADERS[method](conn, df, chunk_size)
+    return len(df)
+
+
+def read_data_version(conn):
+    """Versão atual dos dados (0 se nenhuma ingestão registrou versão)."""
+    if not inspect(conn).has_table(versao_table.name):
+        return 0
+    return conn.execute(select(versao_table.c.versao).where(versao_table.c.id == 1)).scalar() or 0
+
+
+def bump_data_version(conn):
+    """Incrementa a versão dos dados; chamar na mesma transação da carga."""
+    metadata.create_all(conn, tables=[versao_table])
+    current = read_data_version(conn)
+    if current:
+        conn.execute(versao_table.update().where(versao_table.c.id == 1).values(versao=current + 1))
+    else:
+        conn.execute(versao_table.insert().values(id=1, versao=1))
+    return current + 1
+
+
+def read_index_version(conn):
+    """Versão dos dados coberta pelo índice de texto completo (0 se nenhuma)."""
+    if not inspect(conn).has_table(versao_indice_table.name):
+        return 0
+    return conn.execute(select(versao_indice_table.c.versao).where(versao_indice_table.c.id == 1)).scalar() or 0
+
+
+def record_index_version(conn, versao):
+    """Registra que o índice de texto completo cobre a versão `versao` dos dados."""
+    metadata.create_all(conn, tables=[versao_indice_table])
+    if conn.execute(select(versao_indice_table.c.id).where(versao_indice_table.c.id == 1)).first():
+        conn.execute(versao_indice_table.update().where(versao_indice_table.c.id == 1).values(versao=versao))
+    else:
+        conn.execute(versao_indice_table.insert().values(id=1, versao=versao))
+
+
+def key_clause(dialect, pairs, table=dous_table):
+    """
+    Condição que casa exatamente os pares (id, idMateria). O SQL Server não
+    aceita "(a, b) IN (...)", então lá vira um OR de pares.
+    """
+    if dialect.name == "mssql":
+        return or_(*(and_(table.c.id == id_, table.c.idMateria == materia) for id_, materia in pairs))
+    return tuple_(table.c.id, table.c.idMateria).in_(pairs)
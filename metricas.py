@@ -0,0 +1,126 @@
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Limites (em segundos) dos baldes dos histogramas de duração
+DURATION_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=None):
+    pairs = list(key) + (extra or [])
+    if not pairs:
+        return ""
+    body = ",".join(f'{name}="{str(value)}"' for name, value in pairs)
+    return "{" + body + "}"
+
+
+class Histogram:
+    """Histograma cumulativo no formato do Prometheus (baldes, soma e contagem)."""
+
+    def __init__(self, buckets=DURATION_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            yield bound, total
+
+
+class Registry:
+    """
+    Contadores, medidores e histogramas do processo, seguros entre threads.
+    Cada métrica é identificada pelo nome e por um conjunto de rótulos.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+        self._histograms = {}
+        self._help = {}
+
+    def describe(self, name, text):
+        self._help[name] = text
+
+    def inc(self, name, value=1, **labels):
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            key = _label_key(labels)
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self._gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def observe(self, name, value, **labels):
+        with self._lock:
+            series = self._histograms.setdefault(name, {})
+            key = _label_key(labels)
+            if key not in series:
+                series[key] = Histogram()
+            series[key].observe(value)
+
+    @contextmanager
+    def timed(self, name, **labels):
+        """Mede o bloco e registra a duração no histograma `name`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def render(self):
+        """Texto no formato de exposição do Prometheus."""
+        lines = []
+        with self._lock:
+            for kind, metrics in (("counter", self._counters), ("gauge", self._gauges)):
+                for name, series in sorted(metrics.items()):
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} {kind}")
+                    for key, value in sorted(series.items()):
+                        lines.append(f"{name}{_format_labels(key)} {value}")
+            for name, series in sorted(self._histograms.items()):
+                if name in self._help:
+                    lines.append(f"# HELP {name} {self._help[name]}")
+                lines.append(f"# TYPE {name} histogram")
+                for key, histogram in sorted(series.items()):
+                    for bound, total in histogram.cumulative():
+                        le = "+Inf" if bound == float("inf") else repr(float(bound))
+                        lines.append(f"{name}_bucket{_format_labels(key, [('le', le)])} {total}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {histogram.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+
+# Registro único do processo, exposto em /metrics
+registry = Registry()
+
+registry.describe("dous_extracao_etapa_segundos", "Duração de cada etapa da extração de portarias")
+registry.describe("dous_extracao_portarias_total", "Portarias processadas pela extração")
+registry.describe("dous_extracao_tabelas_total", "Tabelas extraídas das portarias")
+registry.describe("dous_extracao_erros_total", "Erros ao processar portarias ou tabelas")
+registry.describe("dous_extracao_execucoes_total", "Execuções completas da extração, por resultado")
+registry.describe("dous_llm_cache_total", "Chamadas ao modelo local atendidas pelo cache persistente (hit) ou pelo modelo (miss)")
+registry.describe("dous_llm_requisicao_segundos", "Duração das requisições bem-sucedidas ao servidor de completions")
+registry.describe("dous_llm_retentativas_total", "Novas tentativas de chamadas ao LLM após falha temporária")
+registry.describe("dous_llm_falhas_total", "Chamadas ao LLM que falharam depois de todas as tentativas")
+registry.describe("dous_ask_total", "Perguntas do /ask por camada que respondeu (regras ou llm)")
+registry.describe("dous_ask_segundos", "Tempo de resposta do /ask por camada")
+registry.describe("dous_sql_recusadas_total", "Consultas geradas pela LLM recusadas pelo guarda de SQL, por motivo")
+registry.describe("dous_consulta_cache_total", "Consultas ao banco atendidas pelo cache de resultados (hit, disk) ou executadas (miss)")
+registry.describe("dous_llm_primeiro_token_segundos", "Tempo até o primeiro token nas respostas em streaming do servidor de completions")
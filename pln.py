@@ -1,12 +1,18 @@
-from bs4 import BeautifulSoup
+import csv
+import logging
+import os
+
 import pandas as pd
 import re
 from io import StringIO
 
-# 1. Extrai texto limpo do XML
+from utils import PortariaDocument
+
+logger = logging.getLogger(__name__)
+
+# 1. Extrai texto limpo do XML (aceita o texto ou um PortariaDocument já parseado)
 def extrair_texto_xml(xml_str):
-    soup = BeautifulSoup(xml_str, 'xml')
-    return soup.get_text(separator='\n').strip()
+    return PortariaDocument.of(xml_str).text
 
 # 2. Converte texto em DataFrame bruto (heurística simples)
 def texto_para_dataframe_bruto(texto):
@@ -40,5 +46,96 @@ def corrigir_tabela_de_texto(texto_xml, llm):
         tabela_corrigida = llm.invoke(prompt)  
         return pd.read_csv(StringIO(tabela_corrigida), sep=";")
     except Exception as e:
-        print(f"Erro ao converter a tabela da LLM: {e}")
-        return pd.DataFrame()  
\ No newline at end of file
+        logger.warning("Erro ao converter a tabela da LLM: %s", e)
+        return pd.DataFrame()  
+
+# 5. Correção de uma tabela já extraída, em janelas de linhas
+# Tamanho máximo de cada janela enviada ao modelo (caracteres do CSV e linhas)
+JANELA_MAX_CARACTERES = int(os.environ.get("DOUS_LLM_JANELA_CARACTERES", "6000"))
+JANELA_MAX_LINHAS = int(os.environ.get("DOUS_LLM_JANELA_LINHAS", "200"))
+
+prompt_corrige_tabela = PromptTemplate.from_template("""
+Você é um especialista em corrigir tabelas extraídas do Diário Oficial.
+Abaixo estão linhas de uma tabela, em CSV com ponto e vírgula (;) como separador.
+Corrija os valores (ex.: palavras quebradas, números mal formatados), sem inventar dados,
+e responda apenas com a tabela em CSV com ponto e vírgula, mantendo exatamente este
+cabeçalho, as mesmas colunas na mesma ordem e uma linha para cada linha recebida.
+
+CABEÇALHO:
+{cabecalho}
+
+LINHAS:
+{tabela_bruta}
+""")
+
+
+def _csv_janela(df):
+    return df.to_csv(index=False, header=False, sep=";").rstrip("\n")
+
+
+def janelas_de_linhas(df, max_caracteres=JANELA_MAX_CARACTERES, max_linhas=JANELA_MAX_LINHAS):
+    """
+    Divide a tabela em janelas contíguas de linhas que cabem no contexto do
+    modelo. As janelas são fatias do DataFrame serializadas separadamente:
+    uma célula com quebra de linha não desloca as linhas das janelas.
+    """
+    # Tamanho de cada linha no CSV (com as aspas das células que precisam)
+    tamanhos = []
+    for linha in df.itertuples(index=False, name=None):
+        buffer = StringIO()
+        csv.writer(buffer, delimiter=";").writerow(["" if pd.isna(valor) else valor for valor in linha])
+        tamanhos.append(len(buffer.getvalue()))
+
+    inicio, tamanho = 0, 0
+    for fim, tamanho_linha in enumerate(tamanhos):
+        if fim > inicio and (tamanho + tamanho_linha > max_caracteres or fim - inicio >= max_linhas):
+            janela = df.iloc[inicio:fim]
+            yield janela, _csv_janela(janela)
+            inicio, tamanho = fim, 0
+        tamanho += tamanho_linha
+    if inicio < len(df):
+        janela = df.iloc[inicio:]
+        yield janela, _csv_janela(janela)
+
+
+def _ler_janela(resposta, original):
+    """
+    Converte a resposta do modelo; se não tiver as mesmas colunas e o mesmo
+    número de linhas, mantém a janela original.
+    """
+    try:
+        corrigida = pd.read_csv(StringIO(resposta), sep=";", dtype=str)
+    except Exception as e:
+        logger.warning("Erro ao converter a tabela da LLM: %s", e)
+        return original
+    if len(corrigida.columns) != len(original.columns):
+        logger.warning("Resposta da LLM com %d colunas (esperado %d); janela mantida sem correção",
+                       len(corrigida.columns), len(original.columns))
+        return original
+    if len(corrigida) != len(original):
+        # Ex.: resposta sem o cabeçalho, em que a primeira linha vira cabeçalho
+        logger.warning("Resposta da LLM com %d linhas (esperado %d); janela mantida sem correção",
+                       len(corrigida), len(original))
+        return original
+    corrigida.columns = original.columns
+    return corrigida
+
+
+def corrigir_tabela(df, llm):
+    """
+    Corrige uma tabela com a LLM enviando só as linhas dela, em janelas que
+    cabem no contexto. Cada janela é enviada uma única vez (todas no mesmo
+    lote) e as respostas são unidas sob o cabeçalho original.
+    """
+    if df.empty:
+        return df
+    cabecalho = ";".join(str(col) for col in df.columns)
+    janelas = list(janelas_de_linhas(df))
+    prompts = [prompt_corrige_tabela.format(cabecalho=cabecalho, tabela_bruta=texto) for _, texto in janelas]
+    try:
+        respostas = llm.batch(prompts)
+    except Exception as e:
+        logger.warning("Erro ao corrigir a tabela com a LLM: %s", e)
+        return df
+    partes = [_ler_janela(resposta, original) for (original, _), resposta in zip(janelas, respostas)]
+    return pd.concat(partes, ignore_index=True)
@@ -0,0 +1,174 @@
+import logging
+import os
+import time
+
+from sqlalchemy.exc import DBAPIError
+
+from cliente_llm import LLMError
+from contexto import compactar_resultado
+from guarda_sql import ConsultaRecusada, executar_consulta_guardada
+from llm import format_response, generate_query, stream_format_response
+from metricas import registry
+from send import clean_html, execute_query_cached
+from utils import build_query, extract_info, score_extraction
+
+logger = logging.getLogger(__name__)
+
+# Confiança mínima para responder só com as regras (sem LLM)
+CONFIANCA_MINIMA = float(os.environ.get("DOUS_ASK_CONFIANCA_MINIMA", "0.6"))
+# Linhas buscadas e listadas na resposta das regras
+REGRAS_MAX_LINHAS = int(os.environ.get("DOUS_ASK_MAX_LINHAS", "50"))
+REGRAS_LINHAS_EXIBIDAS = 10
+# Tamanho máximo de cada valor exibido (textos longos são cortados)
+REGRAS_MAX_CARACTERES = 300
+
+CAMADA_REGRAS = "regras"
+CAMADA_LLM = "llm"
+
+
+def _valor(valor):
+    texto = clean_html(valor) if isinstance(valor, str) else valor
+    texto = " ".join(str(texto).split())
+    if len(texto) > REGRAS_MAX_CARACTERES:
+        texto = texto[:REGRAS_MAX_CARACTERES] + "..."
+    return texto
+
+
+def formatar_linhas(linhas):
+    """Resposta em texto, sem LLM, a partir das linhas do banco."""
+    if not linhas:
+        return "Nenhum resultado encontrado."
+    partes = [f"Encontrei {len(linhas)} resultado(s)."]
+    for linha in linhas[:REGRAS_LINHAS_EXIBIDAS]:
+        campos = linha._mapping.items()
+        partes.append("- " + "; ".join(f"{coluna}: {_valor(valor)}" for coluna, valor in campos if valor is not None))
+    if len(linhas) > REGRAS_LINHAS_EXIBIDAS:
+        partes.append(f"... e mais {len(linhas) - REGRAS_LINHAS_EXIBIDAS} resultado(s).")
+    return "\n".join(partes)
+
+
+def _deduplicar(linhas):
+    # Remove duplicatas mantendo a ordem
+    return list(dict.fromkeys(linhas))
+
+
+def responder_com_regras(pergunta):
+    """
+    Camada determinística: extract_info + build_query. Retorna None quando a
+    confiança fica abaixo de CONFIANCA_MINIMA ou a consulta não retorna linhas.
+    """
+    extraido = extract_info(pergunta)
+    confianca = score_extraction(extraido)
+    if confianca < CONFIANCA_MINIMA:
+        logger.debug("Regras com confiança %.2f; pergunta segue para a LLM", confianca)
+        return None
+    query = build_query(extraido, limit=REGRAS_MAX_LINHAS)
+    linhas, origem = execute_query_cached(query)
+    if not linhas:
+        # Filtro que não acha nada costuma ser extração errada: a LLM tenta
+        logger.debug("Regras sem resultado; pergunta segue para a LLM")
+        return None
+    linhas = _deduplicar(linhas)
+    return {"response": formatar_linhas(linhas), "confianca": confianca, "linhas": len(linhas), "cache": origem}
+
+
+def _preparar_llm(pergunta):
+    """
+    SQL gerado pela LLM → resultado → contexto compacto. Retorna (resultado,
+    contexto); contexto é None quando a resposta já está em resultado (sem
+    dados, consulta recusada ou com erro).
+    """
+    query = generate_query(pergunta)
+    logger.info("Query gerada pela LLM: %s", query)
+    if not query:
+        return {"response": "Não foi possível entender a pergunta.", "linhas": 0}, None
+
+    # O SQL da LLM só roda pelo guarda: leitura, poucas linhas, tempo curto
+    try:
+        colunas, linhas, origem = executar_consulta_guardada(query)
+    except ConsultaRecusada as e:
+        return {"response": f"Não posso executar a consulta gerada: {e}.", "linhas": 0}, None
+    except DBAPIError as e:
+        logger.warning("Falha ao executar a query gerada: %s", e)
+        return {"response": "Não foi possível executar a consulta gerada (erro ou tempo limite).", "linhas": 0}, None
+    logger.debug("Resultado da query: %s", linhas)
+    if not linhas:
+        return {"response": "Nenhum resultado encontrado.", "linhas": 0, "cache": origem}, None
+
+    linhas = _deduplicar(linhas)
+    # Resumo + primeiras linhas dentro do orçamento de tokens, em vez do repr
+    # de todas as linhas
+    return {"linhas": len(linhas), "cache": origem}, compactar_resultado(colunas, linhas)
+
+
+def responder_com_llm(pergunta):
+    """Camada LLM: a LLM gera o SQL e formula a resposta."""
+    resultado, contexto = _preparar_llm(pergunta)
+    if contexto is not None:
+        resultado["response"] = format_response(pergunta, contexto)
+    return resultado
+
+
+def _tentar_regras(pergunta):
+    try:
+        return responder_com_regras(pergunta)
+    except Exception as e:
+        logger.warning("Falha na camada de regras: %s", e)
+        return None
+
+
+def _registrar(camada, inicio):
+    registry.inc("dous_ask_total", camada=camada)
+    registry.observe("dous_ask_segundos", time.perf_counter() - inicio, camada=camada)
+
+
+def responder(pergunta):
+    """
+    Roteador em camadas do /ask: tenta as regras e só recorre à LLM quando
+    elas não respondem. O resultado indica a camada ("camada") que atendeu.
+    """
+    inicio = time.perf_counter()
+    resultado = _tentar_regras(pergunta)
+
+    camada = CAMADA_REGRAS
+    if resultado is None:
+        camada = CAMADA_LLM
+        resultado = responder_com_llm(pergunta)
+
+    _registrar(camada, inicio)
+    return {**resultado, "camada": camada}
+
+
+def responder_stream(pergunta):
+    """
+    Versão em streaming do responder: gera eventos (tipo, dados). Primeiro
+    "meta" (camada, linhas, cache), depois um ou mais "token" com a resposta
+    conforme a LLM escreve e, por fim, "fim"; falhas da LLM no meio do
+    caminho viram um evento "erro".
+    """
+    inicio = time.perf_counter()
+    resultado = _tentar_regras(pergunta)
+    contexto = None
+
+    camada = CAMADA_REGRAS
+    if resultado is None:
+        camada = CAMADA_LLM
+        try:
+            resultado, contexto = _preparar_llm(pergunta)
+        except LLMError as e:
+            yield "erro", {"mensagem": str(e)}
+            return
+
+    yield "meta", {**{k: v for k, v in resultado.items() if k != "response"}, "camada": camada}
+    if contexto is None:
+        yield "token", {"texto": resultado["response"]}
+    else:
+        try:
+            for texto in stream_format_response(pergunta, contexto):
+                yield "token", {"texto": texto}
+        except LLMError as e:
+            yield "erro", {"mensagem": str(e)}
+            return
+
+    _registrar(camada, inicio)
+    yield "fim", {}
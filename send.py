@@ -1,62 +1,258 @@
+import logging
 import os
-import pandas as pd
-import xml.etree.ElementTree as ET
-from sqlalchemy import BigInteger, Float, String, create_engine, text
+import re
+import sys
+import threading
+import time
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine.result import IteratorResult, SimpleResultMetaData
 from bs4 import BeautifulSoup
 
+from cache import PersistentCache, SizedLRUCache, make_key
+from loader import engine_options, read_data_version
+from metricas import registry
+
+logger = logging.getLogger(__name__)
+
 # Configuração do SQL Server
 server = 'CGUAL42872042\\SQLEXPRESS01'
 database = 'dou'
 driver = 'ODBC Driver 17 for SQL Server'
 
-# Criar conexão com SQL Server
 conn_str = f"mssql+pyodbc://@{server}/{database}?driver={driver.replace(' ', '+')}&trusted_connection=yes"
-engine = create_engine(conn_str)
 
-try:
-    engine = create_engine(conn_str)
-    with engine.connect() as conn:
-        print("Conexão bem-sucedida!")
-except Exception as e:
-    print(f"Erro na conexão: {e}")
+# Configuração do pool de conexões (sobrescrevível por variáveis de ambiente)
+# DOUS_DB_URL permite apontar para outro banco (ex.: sqlite:///dous.db para testes locais)
+DB_URL = os.environ.get("DOUS_DB_URL", conn_str)
+POOL_SIZE = int(os.environ.get("DOUS_DB_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.environ.get("DOUS_DB_MAX_OVERFLOW", "10"))
+POOL_RECYCLE = int(os.environ.get("DOUS_DB_POOL_RECYCLE", "1800"))
+PRE_PING = os.environ.get("DOUS_DB_PRE_PING", "1") == "1"
+# Tempo máximo por comando, em segundos (0 desativa)
+STATEMENT_TIMEOUT = int(os.environ.get("DOUS_DB_STATEMENT_TIMEOUT", "60"))
+# Linhas buscadas por vez nas consultas em streaming (stream_query)
+STREAM_BATCH_SIZE = int(os.environ.get("DOUS_DB_STREAM_BATCH_SIZE", "200"))
+# Por quanto tempo (s) a versão dos dados lida do banco é reaproveitada
+DATA_VERSION_TTL = float(os.environ.get("DOUS_DATA_VERSION_TTL", "5"))
+
+# Cache de resultados das consultas (invalidado pela versão dos dados).
+# DOUS_QUERY_CACHE_MB=0 desativa; DOUS_QUERY_CACHE_SPILL_PATH guarda em disco
+# (SQLite) o que não cabe na memória
+QUERY_CACHE_BYTES = int(float(os.environ.get("DOUS_QUERY_CACHE_MB", "64")) * 1024 * 1024)
+QUERY_CACHE_SPILL_PATH = os.environ.get("DOUS_QUERY_CACHE_SPILL_PATH", "")
+QUERY_CACHE_SPILL_MAX_ENTRIES = int(os.environ.get("DOUS_QUERY_CACHE_SPILL_MAX_ENTRIES", "1000"))
+
+_engine = None
+_engine_lock = threading.Lock()
+_data_version = (None, 0.0)
+
+
+def _install_statement_timeout(engine, timeout):
+    """
+    Aplica o limite de tempo por comando: no pyodbc via Connection.timeout;
+    no SQLite via progress handler, que interrompe a consulta após o prazo.
+    Um comando pode usar outro limite com
+    conn.execution_options(statement_timeout=segundos) (0 desativa).
+    """
+    @event.listens_for(engine, "connect")
+    def _on_connect(dbapi_conn, connection_record):
+        if engine.dialect.name == "sqlite":
+            def _progress():
+                deadline = connection_record.info.get("deadline")
+                return 1 if deadline and time.monotonic() > deadline else 0
+            dbapi_conn.set_progress_handler(_progress, 10000)
+        elif hasattr(dbapi_conn, "timeout"):
+            dbapi_conn.timeout = timeout
+
+    if engine.dialect.name == "sqlite":
+        @event.listens_for(engine, "before_cursor_execute")
+        def _before_execute(conn, cursor, statement, parameters, context, executemany):
+            limit = conn.get_execution_options().get("statement_timeout", timeout)
+            if limit:
+                conn.connection.info["deadline"] = time.monotonic() + limit
+            else:
+                conn.connection.info.pop("deadline", None)
+
+        # O prazo vale também para o fetch das linhas; é limpo quando a
+        # conexão volta ao pool
+        @event.listens_for(engine.pool, "reset")
+        def _on_reset(dbapi_conn, connection_record, reset_state):
+            connection_record.info.pop("deadline", None)
+        return
+
+    # O pyodbc lê Connection.timeout ao criar o cursor, que o SQLAlchemy cria
+    # antes de before_cursor_execute: o limite é trocado quando a opção é
+    # definida na conexão e o padrão volta quando ela é devolvida ao pool
+    @event.listens_for(engine, "set_connection_execution_options")
+    def _on_options(conn, opts):
+        dbapi_conn = conn.connection.dbapi_connection
+        if "statement_timeout" in opts and hasattr(dbapi_conn, "timeout"):
+            dbapi_conn.timeout = opts["statement_timeout"]
+
+    @event.listens_for(engine.pool, "checkin")
+    def _on_checkin(dbapi_conn, connection_record):
+        if dbapi_conn is not None and hasattr(dbapi_conn, "timeout"):
+            dbapi_conn.timeout = timeout
+
+
+def create_db_engine(url=None, pool_size=None, max_overflow=None, pre_ping=None, statement_timeout=None):
+    """Cria um engine com pool configurado; parâmetros omitidos vêm do ambiente."""
+    url = url or DB_URL
+    statement_timeout = STATEMENT_TIMEOUT if statement_timeout is None else statement_timeout
+    engine = create_engine(
+        url,
+        pool_size=POOL_SIZE if pool_size is None else pool_size,
+        max_overflow=MAX_OVERFLOW if max_overflow is None else max_overflow,
+        pool_pre_ping=PRE_PING if pre_ping is None else pre_ping,
+        pool_recycle=POOL_RECYCLE,
+        **engine_options(url),
+    )
+    _install_statement_timeout(engine, statement_timeout)
+    return engine
+
+
+def get_engine():
+    """Retorna o engine compartilhado, criado na primeira chamada."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_db_engine()
+    return _engine
+
+
+def get_data_version():
+    """
+    Versão atual dos dados, incrementada pela ingestão. O valor é guardado
+    por DATA_VERSION_TTL segundos para não consultar o banco a cada chamada.
+    """
+    global _data_version
+    version, read_at = _data_version
+    if version is None or time.monotonic() - read_at > DATA_VERSION_TTL:
+        with get_engine().connect() as conn:
+            version = read_data_version(conn)
+        _data_version = (version, time.monotonic())
+    return version
+
+
+def make_rows(columns, values):
+    """Linhas (Row do SQLAlchemy) a partir dos nomes das colunas e das tuplas de valores."""
+    return IteratorResult(SimpleResultMetaData(columns), iter(values)).all()
+
+
+def _result_size(result):
+    # Tamanho aproximado em bytes: valores + sobrecarga de cada linha
+    _, rows = result
+    return sum(sys.getsizeof(value) for row in rows for value in row) + 64 * len(rows)
+
 
-def execute_query(query):
+def _dump_result(result):
+    columns, rows = result
+    return {"colunas": columns, "linhas": [list(row) for row in rows]}
+
+
+def _load_result(stored):
+    return stored["colunas"], make_rows(stored["colunas"], stored["linhas"])
+
+
+def _create_query_cache():
+    if not QUERY_CACHE_BYTES:
+        return None
+    spill = None
+    if QUERY_CACHE_SPILL_PATH:
+        spill = PersistentCache(QUERY_CACHE_SPILL_PATH, QUERY_CACHE_SPILL_MAX_ENTRIES)
+    return SizedLRUCache(QUERY_CACHE_BYTES, _result_size, spill, _dump_result, _load_result)
+
+
+query_cache = _create_query_cache()
+_query_cache_version = None
+_query_cache_lock = threading.Lock()
+
+_SQL_LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+
+def normalize_sql(sql):
+    """SQL com espaços colapsados fora dos literais e sem ';' final (chave do cache)."""
+    parts = _SQL_LITERAL.split(sql.strip().rstrip(";").strip())
+    return "".join(part if i % 2 else re.sub(r"\s+", " ", part) for i, part in enumerate(parts))
+
+
+def query_key(query, params=None):
+    """Chave do cache de resultados: SQL normalizado + parâmetros."""
+    if isinstance(query, str):
+        sql, bound = query, {}
+    else:
+        compiled = query.compile(dialect=get_engine().dialect)
+        sql, bound = str(compiled), compiled.params
+    return normalize_sql(sql), {**bound, **(params or {})}
+
+
+def cached_result(key, compute):
+    """
+    (valor, origem) do cache de resultados para `key` na versão atual dos
+    dados; origem é "hit", "disk", "miss" ou "off" (cache desativado).
+    Quando a ingestão muda a versão, as entradas antigas são descartadas.
+    """
+    global _query_cache_version
+    if query_cache is None:
+        return compute(), "off"
+    version = get_data_version()
+    with _query_cache_lock:
+        stale = _query_cache_version is not None and version != _query_cache_version
+        _query_cache_version = version
+    if stale:
+        query_cache.clear()
+    value, origem = query_cache.get_or_compute(make_key(version, key), compute)
+    registry.inc("dous_consulta_cache_total", resultado=origem)
+    return value, origem
+
+
+def _run_query(statement, params):
+    with get_engine().connect() as conn:
+        result = conn.execute(statement, params or {})
+        rows = result.all()
+        logger.debug("Consulta executada: %d linhas", len(rows))
+        return list(result.keys()), rows
+
+
+def execute_query_cached(query, params=None):
+    """
+    Como execute_query, mas retorna (linhas, origem), com a origem do cache
+    de resultados ("hit", "disk", "miss" ou "off").
+    """
+    statement = text(query) if isinstance(query, str) else query
+    key = ("query",) + query_key(query, params)
+    (_, rows), origem = cached_result(key, lambda: _run_query(statement, params))
+    return rows, origem
+
+
+def execute_query(query, params=None):
     """
     Executa uma consulta SQL e retorna os resultados.
+    `query` pode ser o texto SQL ou uma construção do SQLAlchemy (ex.: text()
+    com bindparams); `params` são os parâmetros nomeados. Resultados
+    repetidos vêm do cache enquanto a versão dos dados não muda.
     """
-    with engine.connect() as conn:
-        result = conn.execute(text(query))
-        if not result:
-            print("Nenhum resultado encontrado.")
-        else:
-            print("Consulta executada com sucesso.")
-        return [row for row in result]
-
-def parse_body(xml_file):
+    return execute_query_cached(query, params)[0]
+
+def stream_query(query, params=None, batch_size=None):
     """
-    Função para extrair campos dentro de <body> no XML.
+    Gera as linhas de uma consulta em lotes de `batch_size` (cursor do lado
+    do servidor quando o driver suporta), sem carregar o resultado inteiro
+    na memória. Não passa pelo cache de resultados; a conexão fica presa ao
+    gerador até ele terminar ou ser fechado.
     """
-    tree = ET.parse(xml_file)
-    root = tree.getroot()
-
-    body_data = {
-        "Identifica": "",
-        "Data": "",
-        "Ementa": "",
-        "Titulo": "",
-        "SubTitulo": "",
-        "Texto": ""
-    }
-
-    # Procurando a tag <body>
-    body_tag = root.find(".//body")
-    if body_tag is not None:
-        for key in body_data.keys():
-            element = body_tag.find(key)
-            if element is not None and element.text:
-                body_data[key] = element.text.strip()
-
-    return body_data
+    statement = text(query) if isinstance(query, str) else query
+    with get_engine().connect() as conn:
+        options = {"stream_results": True, "yield_per": batch_size or STREAM_BATCH_SIZE}
+        if conn.dialect.name == "sqlite":
+            # O prazo do SQLite cobre também o fetch, que aqui dura o tempo
+            # de consumo das linhas
+            options["statement_timeout"] = 0
+        result = conn.execution_options(**options).execute(statement, params or {})
+        yield from result
+
 
 def clean_html(text):
     """Função para limpar HTML do texto"""
@@ -64,126 +260,3 @@ def clean_html(text):
         return text
     soup = BeautifulSoup(text, "html.parser")
     return soup.get_text(separator=" ")
-
-# Processamento dos arquivos XML
-path_folder = "./dados/S01052024"
-files = os.listdir(path_folder)
-
-# Limpeza da tabela antes de inserir dados
-with engine.connect() as conn:
-    conn.execute(text("DELETE FROM dous"))
-    conn.commit()
-
-batch_size = 1000  # Defina o tamanho do lote
-data_list = []
-for file in files:
-    if file.endswith(".xml"):
-        file_path = f"{path_folder}/{file}"
-        df = pd.read_xml(file_path)
-        body_values = parse_body(file_path)
-
-        for key, value in body_values.items():
-            df[key] = value
-
-        # Conversão de tipos
-        df['id'] = df['id'].fillna(0).astype(int)
-        df['idOficio'] = df['idOficio'].fillna(0).astype(int)
-        df['artSize'] = pd.to_numeric(df['artSize'], errors='coerce').fillna(0).astype(int)
-        df['numberPage'] = df['numberPage'].fillna(0).astype(int)
-        df['idMateria'] = df['idMateria'].fillna(0).astype(int)
-
-        float_cols = ["artNotes", "highlightType", "highlightPriority", "highlight", "highlightimage", "highlightimagename", "Midias"]
-        for col in float_cols:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-        df['pubDate'] = df['pubDate'].astype(str)
-
-        # Preenchendo nulos corretamente
-        for col in df.columns:
-            if df[col].dtype == "object":  # Strings
-                df[col] = df[col].fillna("")
-            else:  # Números
-                df[col] = df[col].fillna(0)
-
-        # # Limpeza do HTML
-        # df["Texto"] = df["Texto"].apply(clean_html)
-        df = df.drop_duplicates()
-
-        data_list.append(df)
-
-        # Inserção em lotes para evitar sobrecarga de memória
-        if len(data_list) >= batch_size:
-            batch_df = pd.concat(data_list, ignore_index=True)
-            batch_df.to_sql(
-                "dous",
-                engine,
-                if_exists="append",
-                index=False,
-                dtype={
-                    "id": BigInteger(),
-                    "name": String(255),
-                    "idOficio": BigInteger(),
-                    "pubName": String(50),
-                    "artType": String(255),
-                    "pubDate": String(50),
-                    "artClass": String(255),
-                    "artCategory": String(500),
-                    "artSize": BigInteger(),
-                    "artNotes": Float(),
-                    "numberPage": BigInteger(),
-                    "pdfPage": String(500),
-                    "editionNumber": String(),
-                    "highlightType": Float(),
-                    "highlightPriority": Float(),
-                    "highlight": Float(),
-                    "highlightimage": Float(),
-                    "highlightimagename": Float(),
-                    "idMateria": BigInteger(),
-                    "Midias": Float(),
-                    "Identifica": String(2000),
-                    "Data": String(255),
-                    "Ementa": String(2000),
-                    "Titulo": String(1000),
-                    "SubTitulo": String(1000),
-                    "Texto": String(),
-                }
-            )
-            data_list = []  # Limpa a lista após o lote ser inserido
-
-# Inserção final dos dados restantes, se houver
-if data_list:
-    final_df = pd.concat(data_list, ignore_index=True)
-    final_df.to_sql(
-        "dous",
-        engine,
-        if_exists="append",
-        index=False,
-        dtype={
-            "id": BigInteger(),
-            "name": String(255),
-            "idOficio": BigInteger(),
-            "pubName": String(50),
-            "artType": String(255),
-            "pubDate": String(50),
-            "artClass": String(255),
-            "artCategory": String(500),
-            "artSize": BigInteger(),
-            "artNotes": Float(),
-            "numberPage": BigInteger(),
-            "pdfPage": String(500),
-            "editionNumber": String(),
-            "highlightType": Float(),
-            "highlightPriority": Float(),
-            "highlight": Float(),
-            "highlightimage": Float(),
-            "highlightimagename": Float(),
-            "idMateria": BigInteger(),
-            "Midias": Float(),
-            "Identifica": String(2000),
-            "Data": String(255),
-            "Ementa": String(2000),
-            "Titulo": String(1000),
-            "SubTitulo": String(1000),
-            "Texto": String(),
-        }
-    )
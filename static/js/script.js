@@ -23,26 +23,79 @@ function sendMessage() {
     const question = userInput.value;
     userInput.value = '';
 
-    // Faz a requisição para o backend
+    // Bolha da resposta, preenchida conforme os tokens chegam
+    const botMessage = document.createElement('div');
+    botMessage.classList.add('message', 'bot');
+    const botText = document.createElement('p');
+    botMessage.appendChild(botText);
+    chatBox.appendChild(botMessage);
+
+    // Faz a requisição para o backend (resposta em Server-Sent Events)
     fetch('/ask', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json',
+            'Accept': 'text/event-stream',
         },
-        body: JSON.stringify({ question: question }),
+        body: JSON.stringify({ question: question, stream: true }),
     })
-    .then(response => response.json())
-    .then(data => {
-        // Exibe a resposta do bot
-        const botMessage = document.createElement('div');
-        botMessage.classList.add('message', 'bot');
-        botMessage.innerHTML = `<p>${data.response}</p>`;
-        chatBox.appendChild(botMessage);
-
-        // Rola a tela para a última mensagem
-        chatBox.scrollTop = chatBox.scrollHeight;
+    .then(response => {
+        const contentType = response.headers.get('Content-Type') || '';
+        if (!response.body || !contentType.includes('text/event-stream')) {
+            // Resposta JSON de uma vez (ex.: pergunta inválida)
+            return response.json().then(data => appendText(botText, chatBox, data.response));
+        }
+        return readEvents(response.body, (event, data) => {
+            if (event === 'token') {
+                appendText(botText, chatBox, data.texto);
+            } else if (event === 'erro') {
+                appendText(botText, chatBox, `\n[Erro: ${data.mensagem}]`);
+            }
+        });
     })
     .catch(error => {
         console.error('Erro:', error);
     });
-}
\ No newline at end of file
+}
+
+function appendText(element, chatBox, text) {
+    element.textContent += text;
+
+    // Rola a tela para a última mensagem
+    chatBox.scrollTop = chatBox.scrollHeight;
+}
+
+// Lê um stream de Server-Sent Events e chama onEvent(evento, dados) para cada um
+function readEvents(body, onEvent) {
+    const reader = body.getReader();
+    const decoder = new TextDecoder('utf-8');
+    let buffer = '';
+
+    function pump() {
+        return reader.read().then(({ done, value }) => {
+            if (done) {
+                return;
+            }
+            buffer += decoder.decode(value, { stream: true });
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const raw = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+                let event = 'message';
+                let data = '';
+                raw.split('\n').forEach(line => {
+                    if (line.startsWith('event:')) {
+                        event = line.slice(6).trim();
+                    } else if (line.startsWith('data:')) {
+                        data += line.slice(5).trim();
+                    }
+                });
+                if (data) {
+                    onEvent(event, JSON.parse(data));
+                }
+            }
+            return pump();
+        });
+    }
+    return pump();
+}
@@ -1,81 +1,218 @@
 #Conferir se as tabelas estão sendo extraidas corretamente
 # e se o CSV e XLSX estão sendo salvos corretamente.
+#
+# Os validadores recebem uma Series inteira e retornam uma máscara booleana
+# (True = valor válido). Valores que não são texto são sempre inválidos.
+#
+# Os textos viram um array NumPy de largura fixa (um caractere a mais que o
+# maior formato aceito: valores cortados nunca têm o tamanho certo) e as
+# regras são contas sobre os códigos dos caracteres.
 from datetime import datetime
-import re
 
+import numpy as np
+import pandas as pd
+from pandas.api.types import infer_dtype, is_object_dtype, is_string_dtype
 
-def validate_name(name):
-    """Valida se o nome não é numérico e não está vazio."""
-    if isinstance(name, str) and not name.isdigit() and name.strip():
-        return name
-    else:
-        print(f"Nome inválido: {name}")
-        return None
-def validate_cnes(cnes):
-    """Valida se o CNES tem exatamente 7 dígitos numéricos."""
-    if isinstance(cnes, str) and cnes.isdigit() and len(cnes) == 7:
-        return cnes
-    else:
-        print(f"CNES inválido: {cnes}")
+# Pesos dos dígitos verificadores (módulo 11)
+CNPJ_WEIGHTS = (np.array([5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]),
+                np.array([6, 5, 4, 3, 2, 9, 8, 7, 6, 5, 4, 3, 2]))
+CPF_WEIGHTS = (np.arange(10, 1, -1), np.arange(11, 1, -1))
+
+DAYS_IN_MONTH = np.array([0, 31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+
+# Códigos dos caracteres que o str.strip() remove (o último é U+3000)
+SPACE_CODES = np.array([code for code in range(0x3001) if chr(code).isspace()])
+
+
+def _texts(series):
+    """
+    (máscara das células de texto, array object só com esses textos), ou
+    None se a coluna não for de texto.
+    """
+    if not (is_object_dtype(series) or is_string_dtype(series)):
         return None
-def validate_date(date_str):
-    """Valida se a data está no formato dd/mm/yyyy."""
+    values = series.to_numpy(dtype=object)
+    if infer_dtype(values, skipna=False) == "string":
+        return np.ones(len(values), dtype=bool), values
+    is_text = np.fromiter((isinstance(value, str) for value in values), dtype=bool, count=len(values))
+    return is_text, values[is_text]
+
+
+def _result(series, is_text, valid):
+    result = np.zeros(len(series), dtype=bool)
+    result[is_text] = valid
+    return pd.Series(result, index=series.index)
+
+
+def _false(series):
+    return pd.Series(False, index=series.index)
+
+
+def _fixed(texts, width):
+    """
+    Textos cortados em `width` + 1 caracteres: (matriz de códigos, tamanhos).
+    Só os tamanhos até `width` são exatos.
+    """
+    array = texts.astype(f'U{width + 1}')
+    return array.view(np.uint32).reshape(-1, width + 1), np.char.str_len(array)
+
+
+def _digits(codes):
+    """Matriz uint8 dos dígitos e máscara das linhas só com dígitos."""
+    digits = codes - 48  # em uint32, o que vem antes do '0' dá a volta e fica enorme
+    return digits.astype(np.uint8), (digits <= 9).all(axis=1)
+
+
+def _digits_of_width(series, width):
+    parts = _texts(series)
+    if parts is None:
+        return _false(series)
+    is_text, texts = parts
+    array = texts.astype(f'U{width + 1}')
+    return _result(series, is_text, (np.char.str_len(array) == width) & np.char.isdigit(array))
+
+
+def _check_digit_rows(codes, weights):
+    """Linhas da matriz de códigos com só dígitos e os dois verificadores corretos."""
+    digits, ok = _digits(codes)
+    size = digits.shape[1]
+    # As duas somas ponderadas num só produto de matrizes; em float32 (BLAS)
+    # elas são exatas, bem abaixo de 2**24
+    matrix = np.zeros((size - 1, 2), dtype=np.float32)
+    matrix[:size - 2, 0] = weights[0]
+    matrix[:, 1] = weights[1]
+    remainder = (digits[:, :size - 1].astype(np.float32) @ matrix).astype(np.int64) % 11
+    expected = np.where(remainder < 2, 0, 11 - remainder)
+    ok &= (digits[:, size - 2:] == expected).all(axis=1)
+    # Sequências de um único dígito (00000000000000 etc.) passam na conta, mas não existem
+    return ok & (digits != digits[:, :1]).any(axis=1)
+
+
+def _check_digits(series, template, weights):
+    """
+    Máscara dos documentos com dígitos verificadores corretos. `template`
+    é o formato com pontuação ("0" = dígito); aceita também só os dígitos.
+    Espaços nas pontas são ignorados, como no str.strip().
+    """
+    parts = _texts(series)
+    if parts is None:
+        return _false(series)
+    is_text, texts = parts
+    width = len(template)
+    codes, lengths = _fixed(texts, width)
+    valid = np.zeros(len(texts), dtype=bool)
+
+    size = template.count('0')
+    rows = lengths == size
+    valid[rows] = _check_digit_rows(codes[rows, :size], weights)
+
+    rows = lengths == width
+    digit_positions = [i for i, char in enumerate(template) if char == '0']
+    ok = _check_digit_rows(codes[rows][:, digit_positions], weights)
+    for position, char in enumerate(template):
+        if char != '0':
+            ok &= codes[rows, position] == ord(char)
+    valid[rows] = ok
+
+    # Espaço na primeira ou na última posição visível (ou valor cortado):
+    # os poucos casos que mudam ao aparar são conferidos de novo
+    last = codes[np.arange(len(codes)), np.maximum(np.minimum(lengths, width + 1) - 1, 0)]
+    padded = (lengths > 0) & (_is_space(codes[:, 0]) | _is_space(last) | (lengths > width))
+    if padded.any():
+        stripped = np.array([text.strip() for text in texts[padded]], dtype=object)
+        changed = stripped != texts[padded]
+        rows = np.flatnonzero(padded)[changed]
+        valid[rows] = _check_digits(pd.Series(stripped[changed], dtype=object), template, weights).to_numpy()
+    return _result(series, is_text, valid)
+
+
+def _is_space(codes):
+    return np.isin(codes, SPACE_CODES)
+
+
+def validate_name(series):
+    """Nome não numérico e não vazio."""
+    parts = _texts(series)
+    if parts is None:
+        return _false(series)
+    is_text, texts = parts
+    # Começa com algo que não é dígito nem espaço: já é um nome válido. Só
+    # os demais (vazios, numéricos, com espaço no início) são olhados inteiros
+    first = texts.astype('U1')
+    valid = ~(np.char.isdigit(first) | np.char.isspace(first) | (np.char.str_len(first) == 0))
+    rest = texts[~valid]
+    if len(rest):
+        numeric = np.fromiter(map(str.isdigit, rest), dtype=bool, count=len(rest))
+        blank = np.fromiter(map(str.isspace, rest), dtype=bool, count=len(rest)) | (rest == "")
+        valid[~valid] = ~(numeric | blank)
+    return _result(series, is_text, valid)
+
+
+def validate_cnes(series):
+    """CNES com exatamente 7 dígitos numéricos."""
+    return _digits_of_width(series, 7)
+
+
+def _strptime_ok(text):
     try:
-        datetime.strptime(date_str, '%d/%m/%Y')
-        return date_str
-    except ValueError:
-        print(f"Data inválida: {date_str}")
-        return None
-    
-def validate_cpf(cpf):
-    """Valida se o CPF tem exatamente 11 dígitos numéricos."""
-    if isinstance(cpf, str) and cpf.isdigit() and len(cpf) == 11:
+        datetime.strptime(text, '%d/%m/%Y')
         return True
-    else:
-        print(f"CPF inválido: {cpf}")
-        return False
-    
-def validate_cnpj(cnpj):
-    """Valida se o CNPJ tem 14 dígitos ou está no formato XX.XXX.XXX/0001-XX"""
-    print(f"CNPJ sendo validado....: {cnpj}")
-    if not isinstance(cnpj, str):
+    except ValueError:
         return False
 
-    cnpj = cnpj.strip()
-    
-    # CNPJ só com números
-    if cnpj.isdigit() and len(cnpj) == 14:
-        return cnpj
-
-    # CNPJ formatado
-    pattern = r'^\d{2}\.\d{3}\.\d{3}/\d{4}-\d{2}$'
-    if re.match(pattern, cnpj):
-        return cnpj
-
-    print(f"CNPJ inválido: {cnpj}")
-    return None
-
-def validate_municipio(municipio):
-    """Valida se o município não é numérico e não está vazio."""
-    if isinstance(municipio, str) and not municipio.isdigit() and municipio.strip():
-        return municipio
-    else:
-        print(f"Município inválido: {municipio}")
-        return None
-def validate_uf(uf):
-    """Valida se a UF tem exatamente 2 letras."""
-    if isinstance(uf, str) and len(uf) == 2 and uf.isalpha():
-        return uf.upper()
-    else:
-        print(f"UF inválida: {uf}")
-        return None
 
-def validate_ibge(ibge):
-    """Valida se o código IBGE tem exatamente 6 dígitos numéricos."""
-    if isinstance(ibge, str) and ibge.isdigit() and len(ibge) == 6:
-        return ibge
-    else:
-        print(f"IBGE inválido: {ibge}")
-        return None
+def validate_date(series):
+    """Data no formato dd/mm/yyyy (mesmas regras do datetime.strptime)."""
+    parts = _texts(series)
+    if parts is None:
+        return _false(series)
+    is_text, texts = parts
+    codes, lengths = _fixed(texts, 10)
+    digits, all_digits = _digits(codes[:, [0, 1, 3, 4, 6, 7, 8, 9]])
+    digits = digits.astype(np.int64)
+
+    # dd/mm/yyyy com zeros à esquerda: dia, mês e ano conferidos com NumPy
+    shaped = (lengths == 10) & (codes[:, 2] == ord('/')) & (codes[:, 5] == ord('/')) & all_digits
+    day = digits[:, 0] * 10 + digits[:, 1]
+    month = digits[:, 2] * 10 + digits[:, 3]
+    year = digits[:, 4:] @ np.array([1000, 100, 10, 1])
+    leap = (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    month_ok = (month >= 1) & (month <= 12)
+    last_day = DAYS_IN_MONTH[np.where(month_ok, month, 0)] + (leap & (month == 2))
+    valid = shaped & month_ok & (year >= 1) & (day >= 1) & (day <= last_day)
+
+    # Outras grafias aceitas pelo strptime ("1/5/2024", " 1/05/2024") são raras
+    others = ~shaped & (lengths >= 8) & (lengths <= 10)
+    if others.any():
+        valid[others] = [_strptime_ok(text) for text in texts[others]]
+    return _result(series, is_text, valid)
+
+
+def validate_cpf(series):
+    """CPF com 11 dígitos (ou XXX.XXX.XXX-XX) e dígitos verificadores corretos."""
+    return _check_digits(series, '000.000.000-00', CPF_WEIGHTS)
+
+
+def validate_cnpj(series):
+    """CNPJ com 14 dígitos (ou XX.XXX.XXX/XXXX-XX) e dígitos verificadores corretos."""
+    return _check_digits(series, '00.000.000/0000-00', CNPJ_WEIGHTS)
+
+
+def validate_municipio(series):
+    """Município não numérico e não vazio."""
+    return validate_name(series)
+
+
+def validate_uf(series):
+    """UF com exatamente 2 letras."""
+    parts = _texts(series)
+    if parts is None:
+        return _false(series)
+    is_text, texts = parts
+    array = texts.astype('U3')
+    return _result(series, is_text, (np.char.str_len(array) == 2) & np.char.isalpha(array))
 
 
+def validate_ibge(series):
+    """Código IBGE com exatamente 6 dígitos numéricos."""
+    return _digits_of_width(series, 6)
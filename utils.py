@@ -1,11 +1,35 @@
+import logging
 import re
+import threading
+from functools import cached_property, lru_cache
 
 import pandas as pd
+from pandas.api.types import is_numeric_dtype
 from bs4 import BeautifulSoup
-import spacy
+from sqlalchemy import BigInteger, bindparam, select
+
+try:
+    from lxml import etree
+except ImportError:  # sem lxml, extract_tables_from_xml usa o BeautifulSoup
+    etree = None
+from loader import dous_table
 from testes import validate_cnes, validate_cnpj, validate_cpf, validate_date, validate_ibge, validate_municipio, validate_name, validate_uf
 
-nlp = spacy.load("pt_core_news_sm")
+logger = logging.getLogger(__name__)
+
+_nlp = None
+_nlp_lock = threading.Lock()
+
+
+def get_nlp():
+    """Modelo spaCy pt_core_news_sm, carregado no primeiro uso."""
+    global _nlp
+    if _nlp is None:
+        with _nlp_lock:
+            if _nlp is None:
+                import spacy
+                _nlp = spacy.load("pt_core_news_sm")
+    return _nlp
 
 FIELD_MAPPING = {
     "idOficio": ["ofício", "oficio", "idOficio", "número do ofício", "numero do oficio"],
@@ -38,7 +62,7 @@ FIELD_MAPPING = {
 import re
 from datetime import datetime
 def extract_portaria_info_nlp(texto):
-    doc = nlp(texto)
+    doc = get_nlp()(texto)
     info = {"numero_portaria": None, "data_portaria": None}
     
     for ent in doc.ents:
@@ -90,31 +114,85 @@ def extract_portaria_info(texto):
             info['data_portaria'] = f"{int(dia):02d}/{mes_num}/{ano}"
             
         except Exception as e:
-            print(f"Erro ao processar dados da portaria: {e}")
+            logger.warning("Erro ao processar dados da portaria: %s", e)
     
     return info
 
 
+def _cell_text(cell):
+    # Equivalente ao get_text(strip=True) do BeautifulSoup: cada trecho de
+    # texto é aparado e os trechos são concatenados sem separador
+    return "".join(fragment.strip() for fragment in cell.itertext())
+
+
+def _parse_html(xml_text):
+    """Árvore lxml do texto HTML da portaria (None se vazio ou sem lxml)."""
+    if etree is None or not xml_text:
+        return None
+    return etree.HTML(xml_text)
+
+
+def _tables_from_root(root):
+    results = []
+    for table_index, table in enumerate(root.iter('table')):
+        rows = list(table.iter('tr'))
+        if len(rows) < 2:
+            continue
+
+        headers = [_cell_text(cell) for cell in rows[1].iter('td', 'th')]
+        expected_columns = len(headers)
+        if not expected_columns:
+            continue
+
+        # As linhas vão direto para listas por coluna
+        columns = [[] for _ in range(expected_columns)]
+        for row in rows[2:]:
+            cells = [_cell_text(cell) for cell in row.iter('td')]
+            for col_index, values in enumerate(columns):
+                values.append(cells[col_index] if col_index < len(cells) else None)
+
+        if not columns[0]:
+            continue
+
+        try:
+            df = pd.DataFrame(dict(enumerate(columns)))
+            df.columns = headers
+            results.append(df)
+        except Exception as e:
+            logger.warning("Erro ao criar DataFrame para a tabela %d: %s", table_index + 1, e)
+
+    logger.debug("Extração concluída. Total de DataFrames criados: %d", len(results))
+    return results
+
+
 def extract_tables_from_xml(xml_text):
     """Extrai tabelas de texto HTML/XML e retorna como DataFrames"""
-    print("Iniciando extração de tabelas do XML...")
+    return PortariaDocument.of(xml_text).tables
+
+
+def extract_tables_from_xml_bs4(xml_text):
+    """
+    Implementação original com BeautifulSoup (html.parser). Mantida como
+    referência de paridade e como alternativa quando o lxml não está instalado.
+    """
+    # Os logs por linha só são montados com o nível DEBUG ativo
+    debug = logger.isEnabledFor(logging.DEBUG)
     soup = BeautifulSoup(xml_text, 'html.parser')
     tables = soup.find_all('table')
 
     results = []
     
     for table_index, table in enumerate(tables):
-        print(f"\n Processando tabela {table_index + 1}...")
         rows = table.find_all('tr')
-        print(f"  Número de linhas na tabela: {len(rows)}")
+        logger.debug("Tabela %d: %d linhas", table_index + 1, len(rows))
 
         if len(rows) < 2:
-            print(" Tabela ignorada por ter menos de 2 linhas.")
-            continue  
+            logger.debug("Tabela %d ignorada por ter menos de 2 linhas.", table_index + 1)
+            continue
 
         header_cells = rows[1].find_all(['td', 'th'])
         headers = [cell.get_text(strip=True) for cell in header_cells]
-        print(f"Headers identificados: {headers}")
+        logger.debug("Headers identificados: %s", headers)
 
         data = []
         expected_columns = len(headers) 
@@ -122,7 +200,8 @@ def extract_tables_from_xml(xml_text):
         for row_index, row in enumerate(rows[2:], start=1): 
             cells = row.find_all('td')
             row_data = [cell.get_text(strip=True) for cell in cells]
-            print(f"Linha {row_index} extraída: {row_data}")
+            if debug:
+                logger.debug("Linha %d extraída: %s", row_index, row_data)
 
             if len(row_data) < expected_columns:
                 row_data.extend([None] * (expected_columns - len(row_data)))
@@ -135,22 +214,83 @@ def extract_tables_from_xml(xml_text):
         if headers and data:
             try:
                 df = pd.DataFrame(data, columns=headers)
-                print(f"DataFrame criado com sucesso para a tabela {table_index + 1}.")
                 results.append(df)
             except Exception as e:
-                print(f"Erro ao criar DataFrame para a tabela {table_index + 1}: {e}")
+                logger.warning("Erro ao criar DataFrame para a tabela %d: %s", table_index + 1, e)
         else:
-            print(f"Tabela {table_index + 1} ignorada por falta de headers ou dados.")
+            logger.debug("Tabela %d ignorada por falta de headers ou dados.", table_index + 1)
 
-    print(f"\nExtração concluída. Total de DataFrames criados: {len(results)}")
-    print(f"cabeças dos dataframes: {[df.columns.tolist() for df in results]}")
+    logger.debug("Extração concluída. Total de DataFrames criados: %d", len(results))
     return results
 
 
 
+class PortariaDocument:
+    """
+    Portaria parseada uma única vez. As visões (identifica, número/data,
+    tabelas e texto puro) são calculadas sob demanda e memorizadas, de modo
+    que as etapas do pipeline compartilham a mesma árvore.
+    """
+
+    def __init__(self, texto):
+        self.texto = texto or ""
+
+    @classmethod
+    def of(cls, texto):
+        """Reaproveita o documento se já for um PortariaDocument."""
+        return texto if isinstance(texto, cls) else cls(texto)
+
+    @cached_property
+    def root(self):
+        """Árvore lxml; sem lxml, a sopa do BeautifulSoup (html.parser)."""
+        if etree is None:
+            return BeautifulSoup(self.texto, 'html.parser')
+        return _parse_html(self.texto)
+
+    @cached_property
+    def identifica(self):
+        """Texto do parágrafo de identificação (class="identifica") ou None."""
+        if etree is None:
+            node = self.root.find('p', class_='identifica')
+            return node.get_text() if node else None
+        if self.root is None:
+            return None
+        for node in self.root.iter('p'):
+            if 'identifica' in (node.get('class') or '').split():
+                return "".join(node.itertext())
+        return None
+
+    @cached_property
+    def info(self):
+        """Número e data da portaria, buscados primeiro na identificação."""
+        if self.identifica:
+            info = extract_portaria_info(self.identifica)
+            if info['numero_portaria']:
+                return info
+        return extract_portaria_info(self.texto)
+
+    @cached_property
+    def tables(self):
+        """Tabelas da portaria como DataFrames (mesmo formato de extract_tables_from_xml)."""
+        if etree is None:
+            return extract_tables_from_xml_bs4(self.texto)
+        if self.root is None:
+            return []
+        return _tables_from_root(self.root)
+
+    @cached_property
+    def text(self):
+        """Texto puro, um trecho de texto por linha."""
+        if etree is None:
+            return self.root.get_text(separator='\n').strip()
+        if self.root is None:
+            return ""
+        return "\n".join(self.root.itertext()).strip()
+
+
 def extract_info_from_text(texto):
     """
-    Extrai informações relevantes do texto HTML da portaria
+    Extrai informações relevantes do texto HTML da portaria (ou de um PortariaDocument)
     """
     info = {
         'numero_portaria': None,
@@ -158,12 +298,9 @@ def extract_info_from_text(texto):
         'outros_dados': {}
     }
     
-    # Usar BeautifulSoup para parsear o HTML
-    soup = BeautifulSoup(texto, 'html.parser')
-    
-    identifica = soup.find('p', class_='identifica')
-    if identifica:
-        identifica_text = identifica.get_text()
+    # Aceita o texto HTML ou um PortariaDocument já parseado
+    identifica_text = PortariaDocument.of(texto).identifica
+    if identifica_text:
         portaria_pattern = r'PORTARIA\s+(?:GM/MS\s+)?N[º°]\s*([\d.,]+),\s*DE\s*(\d{1,2}\s+DE\s+[A-Z]+\s+DE\s+\d{4})'
         match = re.search(portaria_pattern, identifica_text, re.IGNORECASE)
         if match:
@@ -206,184 +343,238 @@ def parse_brazilian_date(date_str):
             return None
     return None
 
+# Mapeamento de cabeçalhos com regex para capturar variações. A ordem importa:
+# vale o primeiro padrão que casar com o nome da coluna
+COLUMN_MAPPING = [
+    (r'UF|ESTADO', 'UF'),
+    (r'MUNIC[IÍ]PIO', 'município'),
+    (r'C[OÓ]D(\.|IGO)?\s*IBGE|IBGE', 'código IBGE'),
+    (r'ENTIDADE|FUNDO|RAZÃO SOCIAL', 'nome do fundo'),
+    (r'\bCNPJ\b|\bC[ÓO]D[\. ]*CNPJ\b', 'CNPJ'),
+    (r'ESTABELECIMENTO|NOME FANTASIA|RAZÃO SOCIAL', 'nome do estabelecimento'),
+    (r'CNES| C[ÓO]D(\.|IGO)?\s CNES ', 'CNES'),
+    (r'C[ÓO]D(\.|IGO)?\s*EMENDA', 'código da emenda parlamentar'),
+    (r'VALOR\s*POR\s*EMENDA\s*\(R\$\)', 'valor por emenda'),
+    (r'VALOR\s*POR\s*PARLAMENTAR\s*\(R\$\)', 'valor por parlamentar'),
+    (r'VALOR\s*(TOTAL)?\s*(DA\s*PROPOSTA)?\s*\(?R\$\)?|TOTAL*\(R\$\)?', 'valor'),
+    (r'FUNCIONAL\s*PROGRAM[ÁA]TICA', 'funcional programático'),
+    (r'N[º°]\s*DA\s*PROPOSTA|PROPOSTA\s*SAIPS', 'numero da proposta'),
+    (r'N[ÚU]MERO\s*DA\s*PORTARIA', 'numero da portaria'),
+    (r'DATA', 'data'),
+]
+
+EXPECTED_COLUMNS = [
+    'UF', 'município', 'código IBGE', 'nome do fundo', 'CNPJ',
+    'nome do estabelecimento', 'CNES',
+    'código da emenda parlamentar', 'valor por emenda', 'valor por parlamentar',
+    'valor', 'funcional programático', 'numero da proposta',
+    'numero da portaria', 'data'
+]
+
+# Todos os padrões numa única alternação ancorada no início: cada ramo é um
+# lookahead sobre o nome inteiro, então o primeiro ramo que casar é o do
+# primeiro padrão da lista (mesma prioridade do laço padrão a padrão)
+_COLUMN_REGEX = re.compile(
+    "^(?:" + "|".join(
+        f"(?=.*?(?:{pattern}))(?P<c{index}>)" for index, (pattern, _) in enumerate(COLUMN_MAPPING)
+    ) + ")",
+    re.IGNORECASE | re.DOTALL,
+)
+
+# Cabeçalhos distintos memorizados por resolve_headers
+HEADER_CACHE_SIZE = 4096
+
+
+def _canonical_name(header):
+    match = _COLUMN_REGEX.match(str(header))
+    if match is None:
+        return header
+    return COLUMN_MAPPING[int(match.lastgroup[1:])][1]
+
+
+@lru_cache(maxsize=HEADER_CACHE_SIZE)
+def resolve_headers(headers):
+    """
+    Plano de padronização para uma tupla de cabeçalhos: retorna
+    (renomeação, plano), onde plano lista, para cada coluna esperada, as
+    posições das colunas de origem que viram essa coluna (vazio = ausente).
+    """
+    names = [_canonical_name(header) for header in headers]
+    rename = {header: name for header, name in zip(headers, names) if name != header}
+    plan = tuple(
+        (expected, tuple(position for position, name in enumerate(names) if name == expected))
+        for expected in EXPECTED_COLUMNS
+    )
+    return rename, plan
+
+
+def header_cache_stats():
+    """Estatísticas do cache de cabeçalhos (acertos, faltas, tamanho)."""
+    info = resolve_headers.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+
+
 def standardize_dataframe(df, portaria_info):
     """Padroniza o DataFrame para o formato desejado"""
-    df = df.copy()
-    print(f"DataFrame original:\n{df.head()}")
-    print("Colunas reais no CSV:", df.columns.tolist())
-
-    colunas = df.columns.tolist()
-    for col in colunas:
-        if re.search(r'\bCNPJ\b|\bC[ÓO]D[\. ]*CNPJ\b', col, re.IGNORECASE):
-            print(f"Caso detectado como CNPJ: {col}")
-
-    # Mapeamento de colunas com regex para capturar variações
-    column_mapping = {
-        r'UF|ESTADO': 'UF',
-        r'MUNIC[IÍ]PIO': 'município',
-        r'C[OÓ]D(\.|IGO)?\s*IBGE|IBGE': 'código IBGE',
-        r'ENTIDADE|FUNDO|RAZÃO SOCIAL': 'nome do fundo',
-       r'\bCNPJ\b|\bC[ÓO]D[\. ]*CNPJ\b': 'CNPJ',
-        r'ESTABELECIMENTO|NOME FANTASIA|RAZÃO SOCIAL': 'nome do estabelecimento',
-        r'CNES| C[ÓO]D(\.|IGO)?\s CNES ': 'CNES',
-        r'C[ÓO]D(\.|IGO)?\s*EMENDA': 'código da emenda parlamentar',
-        r'VALOR\s*POR\s*EMENDA\s*\(R\$\)': 'valor por emenda',
-        r'VALOR\s*POR\s*PARLAMENTAR\s*\(R\$\)': 'valor por parlamentar',
-        r'VALOR\s*(TOTAL)?\s*(DA\s*PROPOSTA)?\s*\(?R\$\)?|TOTAL*\(R\$\)?': 'valor',
-        r'FUNCIONAL\s*PROGRAM[ÁA]TICA': 'funcional programático',
-        r'N[º°]\s*DA\s*PROPOSTA|PROPOSTA\s*SAIPS': 'numero da proposta',
-        r'N[ÚU]MERO\s*DA\s*PORTARIA': 'numero da portaria',
-        r'DATA': 'data'
-    }
-
-    # Criar um dicionário de renomeação baseado nos nomes reais do DataFrame
-    rename_dict = {}
-    for col in df.columns:
-        for pattern, new_name in column_mapping.items():
-            if re.search(pattern, col, re.IGNORECASE):
-                rename_dict[col] = new_name
-                break
-    print(f"Renomeação de colunas: {rename_dict}")
-
-
-    # Aplicar a renomeação
-    df.rename(columns=rename_dict, inplace=True)
-    print(f"DataFrame após renomeação:\n{df.head()}")
-
-    # Garantir colunas esperadas
-    expected_columns = [
-        'UF', 'município', 'código IBGE', 'nome do fundo', 'CNPJ',
-        'nome do estabelecimento', 'CNES',
-        'código da emenda parlamentar', 'valor por emenda', 'valor por parlamentar', 
-        'valor', 'funcional programático', 'numero da proposta',
-        'numero da portaria', 'data'
-    ]
-    
-    # Adicionar colunas faltantes
-    for col in expected_columns:
-        if col not in df.columns:
-            df[col] = None  
-    print(f"DataFrame após adição de colunas:\n{df.head()}")
-    
-    if 'numero da portaria' not in df.columns or df['numero da portaria'].isnull().all():
-        df['numero da portaria'] = portaria_info.get('numero_portaria')
-    
-    if 'data' not in df.columns or df['data'].isnull().all():
-        df['data'] = portaria_info.get('data_portaria')
-    
-    print(f"df com colunas {df[expected_columns].head()}")
-    return df[expected_columns]
+    rename_dict, plan = resolve_headers(tuple(df.columns))
+    logger.debug("Renomeação de colunas: %s", rename_dict)
+
+    # Monta o resultado direto das colunas de origem, já na ordem esperada,
+    # sem copiar/renomear o DataFrame original
+    labels = []
+    arrays = []
+    for expected, positions in plan:
+        for position in positions or (None,):
+            labels.append(expected)
+            arrays.append([None] * len(df) if position is None else df.iloc[:, position].to_numpy())
+
+    defaults = {'numero da portaria': portaria_info.get('numero_portaria'),
+                'data': portaria_info.get('data_portaria')}
+    for index, label in enumerate(labels):
+        if label in defaults and pd.isnull(arrays[index]).all():
+            arrays[index] = [defaults[label]] * len(df)
+
+    result = pd.DataFrame(dict(enumerate(arrays)), index=df.index, copy=False)
+    result.columns = labels
+    return result
+
+
+# Coluna → validador aplicado em clean_data
+VALIDATORS = [
+    ('CNES', validate_cnes),
+    ('data', validate_date),
+    ('nome do fundo', validate_name),
+    ('CNPJ', validate_cnpj),
+    ('município', validate_municipio),
+    ('código IBGE', validate_ibge),
+    ('UF', validate_uf),
+]
+# Colunas cujos valores inválidos viram None; nas demais a validação só é registrada no log
+NULL_INVALID = {'CNES', 'data'}
 
 
 def clean_data(df):
-    """Limpa e padroniza os dados com verificações adicionais."""
+    """
+    Limpa e padroniza os dados com verificações adicionais.
+
+    Valores monetários viram números. CNES e data inválidos viram None;
+    nome do fundo, CNPJ, município, código IBGE, UF e número da portaria
+    são conferidos e só o total de válidos vai para o log, sem alterar os
+    valores.
+    """
     # Limpeza de valores monetários
     money_cols = ['valor', 'valor por emenda', 'valor por parlamentar']
     for col in money_cols:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.replace(r'[R$\s.]', '', regex=True)
-            df[col] = df[col].str.replace(',', '.').str.strip()
+        # Colunas já numéricas (clean_data aplicado de novo) ficam como estão
+        if col in df.columns and not is_numeric_dtype(df[col]):
+            df[col] = df[col].astype(str).str.replace(r'[R$\s.]', '', regex=True).str.replace(',', '.', regex=False)
             df[col] = pd.to_numeric(df[col], errors='coerce')
 
-    # Validação de CNES (7 dígitos)
-    if 'CNES' in df.columns:
-        df['CNES_valid'] = df['CNES'].apply(validate_cnes)
-        print(f"CNES válido: {df['CNES_valid'].sum()} registros válidos.")
-
-    # Validação de Data
-    if 'data' in df.columns:
-        df['data_valid'] = df['data'].apply(validate_date)
-        print(f"Datas válidas: {df['data_valid'].sum()} registros válidos.")
-
-    # Validação de Nome (não numérico)
-    if 'nome do fundo' in df.columns:
-        df['nome_fundo_valid'] = df['nome do fundo'].apply(validate_name)
-        print(f"Nomos de fundo válidos: {df['nome_fundo_valid'].sum()} registros válidos.")
-
-    if 'CNPJ' in df.columns:
-        df['cnpj_valid'] = df['CNPJ'].apply(validate_cnpj)
-        print(f"CNPJ válidos: {df['cnpj_valid'].sum()} registros válidos.")
+    # Cada validador retorna uma máscara booleana
+    for col, validator in VALIDATORS:
+        if col in df.columns:
+            valid = validator(df[col])
+            logger.info("%s válidos: %d de %d registros.", col, valid.sum(), len(df))
+            if col in NULL_INVALID:
+                df[col] = df[col].where(valid, None)
 
     if 'numero da portaria' in df.columns:
-        df['numero_portaria_valid'] = df['numero da portaria'].apply(lambda x: x.isnumeric())
-        print(f"Números de portaria válidos: {df['numero_portaria_valid'].sum()} registros válidos.")
-
-    if 'município' in df.columns:
-        df['municipio_valid'] = df['município'].apply(validate_municipio)
-        print(f"Municípios válidos: {df['municipio_valid'].sum()} registros válidos.")
-    
-    if 'código IBGE' in df.columns:
-        df['codigo_ibge_valid'] = df['código IBGE'].apply(validate_ibge)
-        print(f"Códigos IBGE válidos: {df['codigo_ibge_valid'].sum()} registros válidos.")
-
-    if 'UF' in df.columns:
-        df['uf_valid'] = df['UF'].apply(validate_uf)
-        print(f"UF válidas: {df['uf_valid'].sum()} registros válidos.")
-
-    for col in df.columns:
-        if col.endswith('_valid'):
-            base_col = col.replace('_valid', '')
-            if base_col in df.columns:
-                df.loc[~df[col], base_col] = None
-
-    df.drop(columns=[col for col in df.columns if col.endswith('_valid')], inplace=True)
+        valid = df['numero da portaria'].astype(str).str.isnumeric()
+        logger.info("numero da portaria válidos: %d de %d registros.", valid.sum(), len(df))
 
-    print(f"DataFrame após limpeza:\n{df.head()}")
-
-
-    # Retornando o DataFrame completo com as colunas de validação adicionadas
     return df
 
 
+# Palavras que indicam que a "captura do nome" é o resto da frase
+NAME_STOPWORDS = {
+    "a", "o", "as", "os", "da", "do", "das", "dos", "de", "e", "em", "no", "na", "nos", "nas",
+    "que", "qual", "quais", "sobre", "trata", "para", "com", "por", "um", "uma", "é",
+}
+# Teto da confiança quando só o nome (sem idOficio) foi reconhecido
+NAME_ONLY_MAX_SCORE = 0.5
+
 def extract_info(user_input):
     """
     Extrai informações da pergunta do usuário e as separa entre SELECT e WHERE.
     """
     extracted_data = {"select": [], "where": {}}
     
-    print(f"Pergunta recebida: {user_input}")
-    doc = nlp(user_input.lower())
+    logger.info("Pergunta recebida: %s", user_input)
+    doc = get_nlp()(user_input.lower())
     
     # Extrai o idOficio (se presente)
     match_id_oficio = re.search(r"(?:ofício|oficio)\s*(?:número\s*)?(\d+)", user_input, re.IGNORECASE)
     if match_id_oficio:
         extracted_data["where"]["idOficio"] = match_id_oficio.group(1)
-        print(f"Número de ofício extraído: {extracted_data['where']['idOficio']}")
+        logger.debug("Número de ofício extraído: %s", extracted_data['where']['idOficio'])
     
-    # Extrai o nome (se presente)
+    # Extrai o nome (se presente). Descarta capturas que repetem o número do
+    # ofício ou que são só o resto da frase ("da portaria que trata de ...")
     match_name = re.search(r"(?:nome\s*do\s*ofício|nome)\s*(?:de)?\s*([\w\-\_\s]+)", user_input, re.IGNORECASE)
     if match_name:
-        extracted_data["where"]["name"] = match_name.group(1).strip()
-        print(f"Nome extraído: {extracted_data['where']['name']}")
+        name = match_name.group(1).strip()
+        overlaps = match_id_oficio is not None and match_name.start(1) < match_id_oficio.end() \
+            and match_id_oficio.start() < match_name.end(1)
+        remainder = any(word in NAME_STOPWORDS for word in name.lower().split())
+        if name and not overlaps and not remainder:
+            extracted_data["where"]["name"] = name
+            logger.debug("Nome extraído: %s", name)
+        else:
+            logger.debug("Captura de nome descartada: %s", name)
     
     # Identifica colunas para SELECT
     for word in doc:
         for field, keywords in FIELD_MAPPING.items():
             if word.text in keywords and field not in extracted_data["select"]:
                 extracted_data["select"].append(field)
-                print(f"Palavra-chave identificada: {word.text} -> Campo mapeado: {field}")
+                logger.debug("Palavra-chave identificada: %s -> Campo mapeado: %s", word.text, field)
     
     return extracted_data
 
-def build_query(extracted_data):
+# Colunas devolvidas quando a pergunta não cita nenhum campo (sem os textos longos)
+DEFAULT_SELECT = ["id", "idOficio", "name", "pubName", "pubDate", "artType", "Identifica", "Ementa"]
+
+# Colunas da tabela dous pelo nome em minúsculas (FIELD_MAPPING usa "texto", a tabela "Texto")
+_DOUS_COLUMNS_BY_NAME = {column.name.lower(): column for column in dous_table.columns}
+
+
+def score_extraction(extracted_data):
     """
-    Gera a melhor query SQL baseada nos campos extraídos.
+    Confiança (0 a 1) de que a consulta montada por build_query responde à
+    pergunta: filtros exatos pesam mais que campos reconhecidos no SELECT.
     """
-    if not extracted_data["select"]:
-        extracted_data["select"].append("*")  
-    
-    columns_str = ", ".join(extracted_data["select"])
-    query = f"SELECT {columns_str} FROM dous"
-    
-    where_clauses = []
+    where = extracted_data["where"]
+    score = 0.0
+    if "idOficio" in where:
+        score += 0.6
+    if "name" in where:
+        # O padrão do nome é guloso: nomes longos costumam ser o resto da frase
+        score += 0.3 if len(where["name"].split()) <= 6 else 0.1
+    score += min(0.2 * len(extracted_data["select"]), 0.4)
+    if "idOficio" not in where:
+        # Sem o número do ofício a captura do nome é frágil: fica abaixo do
+        # mínimo das regras e a pergunta segue para a LLM
+        score = min(score, NAME_ONLY_MAX_SCORE)
+    return min(score, 1.0)
+
+
+def build_query(extracted_data, limit=None):
+    """
+    Gera a consulta SQL (SQLAlchemy, parametrizada) baseada nos campos
+    extraídos. `limit` vira TOP/LIMIT conforme o banco.
+    """
+    fields = extracted_data["select"] or DEFAULT_SELECT
+    columns = [_DOUS_COLUMNS_BY_NAME[field.lower()] for field in fields if field.lower() in _DOUS_COLUMNS_BY_NAME]
+    query = select(*columns)
+
     for field, value in extracted_data["where"].items():
-        if isinstance(value, str) and not value.isnumeric():
-            where_clauses.append(f"{field} = '{value}'")
-        else:
-            where_clauses.append(f"{field} = {value}")
-    
-    if where_clauses:
-        query += " WHERE " + " AND ".join(where_clauses)
-    
-    print(f"Query gerada: {query}")
-    return query
\ No newline at end of file
+        column = _DOUS_COLUMNS_BY_NAME[field.lower()]
+        if isinstance(column.type, BigInteger):
+            value = int(value)
+        query = query.where(column == bindparam(f"where_{field}", value))
+
+    if limit is not None:
+        query = query.limit(limit)
+
+    logger.info("Query gerada: %s", query)
+    return query